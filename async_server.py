@@ -0,0 +1,170 @@
+import asyncio
+import json
+
+from aiohttp import web
+
+from sqlite_store import SEARCH_RANK_WINDOW
+
+
+def _param(value, default=None, type=int):
+    """Igual que type= de Flask: ausente o inválido → default (nunca un 500)."""
+    if value is None:
+        return default
+    try:
+        return type(value)
+    except ValueError:
+        return default
+
+
+def create_app(worker, cache, sqlite_cache, speech_buffer, apply_config,
+               history_max_limit=200):
+    """
+    Mismas rutas que el servidor Flask, servidas en el loop del worker.
+    - /api/translation (+ /poll, /stream)
+    - /api/reset
+    - /api/cache/stats (+ tamaño en disco de translations.db)
+    - /api/history (?limit=&cursor=, siguiente página en X-Next-Cursor)
+    - /api/search (?q=&limit=&cursor=; X-Search-Capped si la ventana de ranking se llenó)
+    - /api/config
+    """
+    routes = web.RouteTableDef()
+
+    # ==========================
+    # TRADUCCIÓN ACTUAL
+    # ==========================
+    @routes.get("/api/translation")
+    async def get_translation(request):
+        return web.json_response(worker.get_current_translation())
+
+    @routes.get("/api/translation/poll")
+    async def poll_translation(request):
+        since = _param(request.query.get("since"), -1)
+        timeout = min(_param(request.query.get("timeout"), 25, float), 60)
+
+        state = worker.get_current_translation()
+        if state["rev"] > since:
+            return web.json_response(state)
+
+        q = worker.subscribe()
+        try:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while state["rev"] <= since:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    state = await asyncio.wait_for(q.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            worker.unsubscribe(q)
+
+        return web.json_response(worker.get_current_translation())
+
+    @routes.get("/api/translation/stream")
+    async def stream_translation(request):
+        since = _param(request.headers.get("Last-Event-ID"), -1)
+
+        resp = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        await resp.prepare(request)
+
+        q = worker.subscribe()
+        try:
+            state = worker.get_current_translation()
+            while True:
+                if state["rev"] > since:
+                    since = state["rev"]
+                    await resp.write(
+                        f"id: {since}\nevent: translation\ndata: {json.dumps(state)}\n\n".encode()
+                    )
+                try:
+                    state = await asyncio.wait_for(q.get(), 15)
+                except asyncio.TimeoutError:
+                    await resp.write(b": keep-alive\n\n")
+        except ConnectionResetError:
+            pass
+        finally:
+            worker.unsubscribe(q)
+
+        return resp
+
+    # ==========================
+    # CONTROL / STATS
+    # ==========================
+    @routes.post("/api/reset")
+    async def reset(request):
+        worker.reset_state()
+        speech_buffer.force_flush()
+        return web.json_response({"status": "reset"})
+
+    @routes.get("/api/cache/stats")
+    async def get_cache_stats(request):
+        disk = await asyncio.to_thread(sqlite_cache.disk_stats)
+        return web.json_response(dict(cache.get_stats(), sqlite=disk))
+
+    @routes.get("/api/history")
+    async def get_history(request):
+        # Paginación por cursor: ?cursor=<X-Next-Cursor de la página anterior>
+        limit = max(1, min(_param(request.query.get("limit"), 30), history_max_limit))
+        cursor = _param(request.query.get("cursor"))
+
+        # SQLite fuera del loop
+        items, next_cursor = await asyncio.to_thread(
+            sqlite_cache.get_history,
+            limit=limit,
+            namespace=worker.namespace,
+            cursor=cursor
+        )
+
+        headers = {}
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = str(next_cursor)
+        return web.json_response(items, headers=headers)
+
+    @routes.get("/api/search")
+    async def search_translations(request):
+        # ?q=término&limit=&cursor=<X-Next-Cursor de la página anterior>
+        limit = max(1, min(_param(request.query.get("limit"), 20), history_max_limit))
+        cursor = _param(request.query.get("cursor"))
+
+        items, next_cursor, capped = await asyncio.to_thread(
+            sqlite_cache.search,
+            request.query.get("q", ""),
+            limit=limit,
+            namespace=worker.namespace,
+            cursor=cursor
+        )
+
+        headers = {}
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = str(next_cursor)
+        if capped:
+            # Solo se rankean las N coincidencias más nuevas: afinar la búsqueda
+            headers["X-Search-Capped"] = str(SEARCH_RANK_WINDOW)
+        return web.json_response(items, headers=headers)
+
+    @routes.post("/api/config")
+    async def save_config(request):
+        try:
+            data = await request.json()
+        except Exception:
+            data = {}
+
+        body, status = await asyncio.to_thread(apply_config, data or {})
+        return web.json_response(body, status=status)
+
+    app = web.Application()
+    app.add_routes(routes)
+    return app
+
+
+async def serve(app, host="0.0.0.0", port=5000):
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
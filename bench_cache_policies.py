@@ -0,0 +1,73 @@
+"""
+Benchmark de hit rate de las políticas del cache RAM.
+
+Reproduce trazas de claves (una clave por línea, p.ej. grabadas con
+DSTRANSLATOR_CACHE_TRACE=trace.txt) sobre cada política: get → si falla, set.
+Sin trazas usa una sintética: strings recurrentes de UI / muletillas (Zipf)
+intercalados con escenas largas de narración única.
+
+Uso:
+    python bench_cache_policies.py [trace.txt ...] [--size 500]
+"""
+
+import argparse
+import random
+
+from cache_policies import POLICIES, make_policy
+
+
+def synthetic_trace(n=200_000, recurring=300, seed=7):
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(recurring)]
+    trace = []
+    unique = 0
+
+    while len(trace) < n:
+        # Tramo normal: 70% recurrentes, 30% únicas
+        for _ in range(rng.randint(200, 800)):
+            if rng.random() < 0.7:
+                trace.append(f"ui-{rng.choices(range(recurring), weights)[0]}")
+            else:
+                unique += 1
+                trace.append(f"line-{unique}")
+
+        # Escena larga de narración única (barrido)
+        for _ in range(rng.randint(300, 2000)):
+            unique += 1
+            trace.append(f"line-{unique}")
+
+    return trace[:n]
+
+
+def load_trace(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def replay(policy_name, trace, size):
+    policy = make_policy(policy_name, size)
+    hits = 0
+    for key in trace:
+        if policy.get(key) is not None:
+            hits += 1
+        else:
+            policy.put(key, key)
+    return hits / len(trace) * 100
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("traces", nargs="*")
+    parser.add_argument("--size", type=int, default=500)
+    args = parser.parse_args()
+
+    traces = [(p, load_trace(p)) for p in args.traces] or [("synthetic", synthetic_trace())]
+
+    for name, trace in traces:
+        print(f"[{name}] {len(trace):,} accesos, {len(set(trace)):,} claves, cache={args.size}")
+        for policy_name in POLICIES:
+            print(f"  {policy_name:8} hit rate {replay(policy_name, trace, args.size):5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
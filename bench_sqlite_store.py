@@ -0,0 +1,118 @@
+"""
+Benchmark de latencia get/set de SQLiteTranslationStore.
+
+Compara:
+- legacy: connect() + 1 statement + close() por llamada, bajo un lock global
+- pool:   SQLiteTranslationStore (conexiones persistentes + WAL)
+- wb:     SQLiteTranslationStore(write_behind=True) (group commit)
+
+Uso:
+    python bench_sqlite_store.py [--rows 2000] [--threads 4]
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from cache_keys import make_key
+from sqlite_store import SQLiteTranslationStore
+
+LEGACY_GET = "SELECT value FROM translations WHERE key = ?"
+LEGACY_SET = "INSERT OR REPLACE INTO translations (key, value, created_at) VALUES (?, ?, ?)"
+
+
+class LegacyStore:
+    """Réplica del store anterior (conexión por llamada)."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at INTEGER
+                )
+            """)
+
+    def get(self, text):
+        key = make_key(text)
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(LEGACY_GET, (key,)).fetchone()
+            return row[0] if row else None
+
+    def set(self, text, value):
+        key = make_key(text)
+        with self.lock, sqlite3.connect(self.db_path) as conn:
+            conn.execute(LEGACY_SET, (key, value, int(time.time())))
+            conn.commit()
+
+
+def _timed(fn, items):
+    samples = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(*item)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return samples
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    return f"mean={statistics.mean(samples):8.1f}µs  p95={p95:8.1f}µs"
+
+
+def _concurrent_gets(store, keys, threads):
+    def run():
+        for k in keys:
+            store.get(k)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    return (len(keys) * threads) / elapsed
+
+
+def bench(name, store, rows, threads):
+    texts = [(f"línea de prueba número {i}",) for i in range(rows)]
+    pairs = [(t, f"test line number {i}") for i, (t,) in enumerate(texts)]
+
+    set_samples = _timed(store.set, pairs)
+    get_samples = _timed(store.get, texts)
+    ops = _concurrent_gets(store, [t for (t,) in texts], threads)
+
+    print(f"[{name:6}] set {_summary(set_samples)}")
+    print(f"[{name:6}] get {_summary(get_samples)}")
+    print(f"[{name:6}] get x{threads} threads: {ops:,.0f} ops/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bench("legacy", LegacyStore(os.path.join(tmp, "legacy.db")), args.rows, args.threads)
+
+        store = SQLiteTranslationStore(os.path.join(tmp, "pool.db"))
+        bench("pool", store, args.rows, args.threads)
+        store.close()
+
+        store = SQLiteTranslationStore(os.path.join(tmp, "wb.db"), write_behind=True)
+        bench("wb", store, args.rows, args.threads)
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Traducción masiva offline (llena la cache sin pasar por el clipboard).
+
+Mismo pipeline que el overlay: TranslationWorker (speaker, filtro trivial,
+cache RAM + SQLite, DeepSeekClient). Lee y escribe en streaming:
+memoria constante sin importar el tamaño del archivo.
+
+Uso:
+    python bulk_translate.py guion.txt -o guion.en.txt
+    python bulk_translate.py dump.jsonl -o out.jsonl --field text
+    python bulk_translate.py capitulo.srt -o capitulo.en.srt --resume
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import deque
+
+from config_manager import ConfigManager
+from deepseek_client import DeepSeekClient
+from translation_cache import TranslationCache
+from sqlite_store import SQLiteTranslationStore
+from names import KNOWN_NAMES
+from translation_worker import TranslationWorker
+
+
+# ==========================
+# LECTORES (generadores: una unidad a la vez)
+# ==========================
+def read_text(f, field=None):
+    for line in f:
+        line = line.rstrip("\r\n")
+        yield line, line
+
+
+def read_jsonl(f, field="text"):
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        obj = json.loads(line)
+        text = obj if isinstance(obj, str) else obj.get(field, "")
+        yield obj, text
+
+
+def read_srt(f, field=None):
+    """Bloques: índice, tiempos, texto (1+ líneas), línea vacía."""
+    block = []
+    for line in f:
+        line = line.rstrip("\r\n").lstrip("\ufeff")
+        if line.strip():
+            block.append(line)
+            continue
+        if block:
+            yield block, "\n".join(block[2:])
+            block = []
+    if block:
+        yield block, "\n".join(block[2:])
+
+
+# ==========================
+# ESCRITORES
+# ==========================
+def write_text(out, unit, text, translation, error):
+    out.write((translation or text) + "\n")
+
+
+def write_jsonl(out, unit, text, translation, error):
+    if isinstance(unit, str):
+        unit = {"text": unit}
+    unit = dict(unit, translation=translation)
+    if error:
+        unit["error"] = error
+    out.write(json.dumps(unit, ensure_ascii=False) + "\n")
+
+
+def write_srt(out, unit, text, translation, error):
+    out.write("\n".join(unit[:2] + [translation or text]) + "\n\n")
+
+
+FORMATS = {
+    "text": (read_text, write_text),
+    "jsonl": (read_jsonl, write_jsonl),
+    "srt": (read_srt, write_srt),
+}
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".srt":
+        return "srt"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    return "text"
+
+
+# ==========================
+# CHECKPOINT
+# ==========================
+def load_checkpoint(path, input_path):
+    """
+    Retorna (unidades hechas, bytes válidos de la salida).
+    Lo escrito después del checkpoint se descarta al reanudar.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return 0, 0
+
+    if data.get("input") != os.path.abspath(input_path):
+        print(f"[Bulk] ⚠ Checkpoint de otro archivo ({data.get('input')}) → desde cero")
+        return 0, 0
+    if "offset" not in data:
+        print("[Bulk] ⚠ Checkpoint sin offset de salida → desde cero")
+        return 0, 0
+    return int(data.get("done", 0)), int(data["offset"])
+
+
+def save_checkpoint(path, input_path, done, offset):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"input": os.path.abspath(input_path), "done": done, "offset": offset}, f)
+    os.replace(tmp, path)
+
+
+# ==========================
+# PROGRESO
+# ==========================
+class Progress:
+    def __init__(self, start_at=0, every=5.0, stream=sys.stderr):
+        self.done = start_at
+        self.new = 0
+        self.skipped = 0
+        self.errors = 0
+        self.every = every
+        self.stream = stream
+        self.t_start = time.time()
+        self.t_last = self.t_start
+
+    def add(self, translation, error):
+        self.done += 1
+        self.new += 1
+        if error:
+            self.errors += 1
+        elif translation is None:
+            self.skipped += 1
+
+        now = time.time()
+        if now - self.t_last >= self.every:
+            self.t_last = now
+            self.report()
+
+    def report(self, final=False, cache_stats=None):
+        elapsed = max(time.time() - self.t_start, 1e-9)
+        tag = "✅ Listo" if final else "⏳"
+        msg = (
+            f"[Bulk] {tag} {self.done} unidades "
+            f"(+{self.new} en {elapsed:.0f}s, {self.new / elapsed:.1f}/s) "
+            f"| trivial={self.skipped} | errores={self.errors}"
+        )
+        if cache_stats:
+            msg += f" | RAM hit={cache_stats['hit_rate']}"
+        print(msg, file=self.stream, flush=True)
+
+
+# ==========================
+# PIPELINE
+# ==========================
+async def run(args):
+    fmt = args.format or detect_format(args.input)
+    reader, writer = FORMATS[fmt]
+    checkpoint = args.output + ".ckpt"
+
+    skip, offset = load_checkpoint(checkpoint, args.input) if args.resume else (0, 0)
+    if skip:
+        # Salida = exactamente lo cubierto por el checkpoint (sin duplicados)
+        os.truncate(args.output, offset)
+        print(f"[Bulk] ↩ Reanudando desde la unidad {skip}", file=sys.stderr)
+
+    config = ConfigManager()
+    api_key = config.get_api_key()
+    target_language = args.lang or config.get_target_language()
+
+    deepseek = DeepSeekClient(api_key=api_key, target_language=target_language)
+
+    cache = TranslationCache(max_size=args.ram_size, policy="tinylfu")
+    sqlite_cache = SQLiteTranslationStore(db_path=args.db, write_behind=True)
+    sqlite_cache.claim_legacy(deepseek.cache_namespace)
+    for legacy in deepseek.legacy_namespaces:
+        sqlite_cache.claim_legacy(deepseek.cache_namespace, legacy)
+
+    # Ventana acotada: nunca hay más de `window` textos pendientes
+    # (pending_max ≥ window → el worker no descarta nada)
+    window = args.concurrency * args.window
+    worker = TranslationWorker(
+        deepseek=deepseek,
+        cache=cache,
+        sqlite_cache=sqlite_cache,
+        KNOWN_NAMES=KNOWN_NAMES,
+        pending_max=window,
+        max_concurrency=args.concurrency,
+        batch_max=args.batch
+    )
+
+    progress = Progress(start_at=skip, every=args.progress)
+    quiet = open(os.devnull, "w") if args.quiet else None
+
+    await deepseek.start(warmup=False)
+    try:
+        with open(args.input, "r", encoding="utf-8") as src, \
+             open(args.output, "a" if skip else "w", encoding="utf-8") as out, \
+             contextlib.redirect_stdout(quiet or sys.stdout):
+
+            pending = deque()
+
+            async def drain_one():
+                unit, text, task = pending.popleft()
+                translation = await task
+                error = None
+                if translation and translation.startswith("[Error:"):
+                    error, translation = translation, None
+                writer(out, unit, text, translation, error)
+                progress.add(translation, error)
+
+                if progress.done % args.checkpoint_every == 0:
+                    out.flush()
+                    save_checkpoint(checkpoint, args.input, progress.done, out.tell())
+
+            for i, (unit, text) in enumerate(reader(src, args.field)):
+                if i < skip:
+                    continue
+
+                if text.strip():
+                    task = asyncio.ensure_future(worker.traducir_texto(text))
+                else:
+                    task = asyncio.ensure_future(asyncio.sleep(0))
+                pending.append((unit, text, task))
+
+                # Salida en orden de entrada; espera al más antiguo
+                if len(pending) >= window:
+                    await drain_one()
+
+            while pending:
+                await drain_one()
+
+            out.flush()
+            save_checkpoint(checkpoint, args.input, progress.done, out.tell())
+
+    finally:
+        await deepseek.close()
+        sqlite_cache.close()
+        if quiet:
+            quiet.close()
+
+    progress.report(final=True, cache_stats=cache.get_stats())
+    if progress.errors:
+        print(
+            f"[Bulk] ⚠ {progress.errors} errores (texto original en la salida). "
+            "Re-ejecutar sin --resume: lo ya traducido sale de cache.",
+            file=sys.stderr
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Traducción masiva offline (pre-llenado de cache)")
+    parser.add_argument("input", help="archivo de entrada (.txt, .jsonl, .srt)")
+    parser.add_argument("-o", "--output", required=True, help="archivo de salida")
+    parser.add_argument("--format", choices=sorted(FORMATS), help="por defecto según extensión")
+    parser.add_argument("--field", default="text", help="campo de texto en JSONL")
+    parser.add_argument("--lang", help="idioma destino (por defecto el de la config)")
+    parser.add_argument("--db", default="translations.db", help="base SQLite de cache")
+    parser.add_argument("--concurrency", type=int, default=3, help="llamadas API en paralelo")
+    parser.add_argument("--window", type=int, default=4, help="textos pendientes por slot")
+    parser.add_argument("--batch", type=int, default=8, help="textos por request (1 = sin batch)")
+    parser.add_argument("--ram-size", type=int, default=2000, help="tamaño de la cache RAM")
+    parser.add_argument("--resume", action="store_true", help="continuar desde el checkpoint")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="unidades entre checkpoints")
+    parser.add_argument("--progress", type=float, default=5.0, help="segundos entre reportes")
+    parser.add_argument("--quiet", action="store_true", help="sin logs del pipeline (solo progreso)")
+    args = parser.parse_args(argv)
+
+    if not ConfigManager().get_api_key():
+        parser.error("DeepSeek API key no configurada (config/user_config.json)")
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import hashlib
+import re
+
+
+# ==========================
+# FORMATO DE CLAVE
+# ==========================
+# v1: normalización propia de cada tier (RAM / SQLite), md5 para textos largos
+# v2: normalización única (este módulo), sha1 con prefijo "#" para textos largos
+KEY_VERSION = 2
+
+HASH_THRESHOLD = 200
+HASH_PREFIX = "#"
+
+# Comillas comunes + japonesas + puntos suspensivos (tabla precompilada)
+_CHAR_MAP = str.maketrans({
+    '…': '...',
+    '“': '"',
+    '”': '"',
+    '„': '"',
+    '«': '"',
+    '»': '"',
+    '‘': "'",
+    '’': "'",
+    '‚': "'",
+    '『': '「',
+    '』': '」',
+})
+
+# Espacios alrededor de comillas
+_QUOTE_SPACES = re.compile(r'\s*([「」"\'])\s*')
+
+# Clave v1 hasheada (md5 hex) → no se puede recalcular
+_LEGACY_HASH = re.compile(r'[0-9a-f]{32}')
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza texto para matching estable entre tiers y sesiones.
+    """
+    # Remueve espacios extra, newlines múltiples
+    normalized = ' '.join(text.strip().split())
+
+    # Comillas / puntos suspensivos
+    normalized = normalized.translate(_CHAR_MAP)
+
+    # Remover espacios alrededor de comillas
+    return _QUOTE_SPACES.sub(r'\1', normalized)
+
+
+def make_key(text: str) -> str:
+    """
+    Clave de cache (RAM + SQLite).
+    Textos largos → hash (sha1 usa aceleración por hardware, más rápido que md5).
+    """
+    normalized = normalize_text(text)
+
+    if len(normalized) > HASH_THRESHOLD:
+        digest = hashlib.sha1(normalized.encode(), usedforsecurity=False).hexdigest()
+        return HASH_PREFIX + digest
+
+    return normalized
+
+
+def migrate_key_v1(old_key: str):
+    """
+    Convierte una clave v1 (SQLite) al formato actual.
+    Retorna None si no se puede recalcular (hash md5 v1).
+    """
+    if _LEGACY_HASH.fullmatch(old_key):
+        return None
+    return make_key(old_key)
+
+
+def make_namespace(target_language: str, model: str, prompt: str) -> str:
+    """
+    Namespace de cache: idioma destino | modelo | huella del prompt.
+    Cambiar cualquiera de los tres separa las entradas sin borrar las otras.
+    """
+    fingerprint = hashlib.sha1(prompt.encode(), usedforsecurity=False).hexdigest()[:12]
+    return f"{target_language.strip().lower()}|{model}|{fingerprint}"
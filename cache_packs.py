@@ -0,0 +1,56 @@
+"""
+Packs de traducciones (caches precalculadas para compartir entre instalaciones).
+
+Uso:
+    python cache_packs.py export juego.db --ns "english|deepseek-chat|abc123def456"
+    python cache_packs.py export juego.jsonl.gz
+    python cache_packs.py import juego.jsonl.gz [--ns ...] [--overwrite]
+    python cache_packs.py import dist/translations.db --ns "..."   (base v1)
+    python cache_packs.py compact [--compress zstd]
+
+Para usar un pack sin copiarlo: dejar el .db en la carpeta packs/
+(se adjunta como solo lectura detrás de translations.db al iniciar).
+"""
+
+import argparse
+
+from sqlite_store import SQLiteTranslationStore
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export / import de packs de traducciones")
+    parser.add_argument("--db", default="translations.db", help="base SQLite de cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="exportar a .db (pack) o JSONL (.gz opcional)")
+    exp.add_argument("path")
+    exp.add_argument("--ns", help="solo este namespace (por defecto todos)")
+
+    imp = sub.add_parser("import", help="importar un pack .db (cualquier versión) o JSONL")
+    imp.add_argument("path")
+    imp.add_argument("--ns", help="reasignar todas las filas a este namespace")
+    imp.add_argument("--overwrite", action="store_true", help="el pack pisa las traducciones propias")
+
+    comp = sub.add_parser("compact", help="comprimir valores largos + VACUUM completo")
+    comp.add_argument("--compress", choices=["zlib", "zstd"], default="zlib")
+
+    args = parser.parse_args(argv)
+
+    store = SQLiteTranslationStore(
+        db_path=args.db,
+        compress=getattr(args, "compress", None),
+        maintenance_interval=None
+    )
+    try:
+        if args.command == "export":
+            store.export_pack(args.path, namespace=args.ns)
+        elif args.command == "import":
+            store.import_pack(args.path, namespace=args.ns, overwrite=args.overwrite)
+        else:
+            store.compact()
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+from collections import OrderedDict
+
+
+# ==========================
+# POLÍTICAS DE EVICCIÓN (RAM)
+# ==========================
+# Interfaz común (NO thread-safe; TranslationCache pone el lock):
+# - get(key)        → valor o None (registra el acceso)
+# - put(key, value) → inserta; si ya existe solo refresca
+# - __contains__, __len__, clear()
+
+
+class LRUPolicy:
+    """LRU clásico (comportamiento original)."""
+
+    name = "lru"
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.data = OrderedDict()
+
+    def get(self, key):
+        if key in self.data:
+            self.data.move_to_end(key)
+            return self.data[key]
+        return None
+
+    def put(self, key, value):
+        if key in self.data:
+            self.data.move_to_end(key)
+            return
+
+        self.data[key] = value
+        if len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        self.data.clear()
+
+
+class SLRUPolicy:
+    """
+    LRU segmentado: entradas nuevas van a probation; un segundo
+    acceso las promueve a protected. Un barrido de textos únicos
+    solo recicla probation.
+    """
+
+    name = "slru"
+
+    def __init__(self, max_size, protected_ratio=0.8):
+        self.max_size = max_size
+        self.protected_max = max(1, int(max_size * protected_ratio))
+        self.probation = OrderedDict()
+        self.protected = OrderedDict()
+
+    def get(self, key):
+        if key in self.protected:
+            self.protected.move_to_end(key)
+            return self.protected[key]
+
+        if key in self.probation:
+            value = self.probation.pop(key)
+            self._protect(key, value)
+            return value
+
+        return None
+
+    def _protect(self, key, value):
+        self.protected[key] = value
+        if len(self.protected) > self.protected_max:
+            # Degradado: vuelve a probation como MRU
+            old_key, old_value = self.protected.popitem(last=False)
+            self.probation[old_key] = old_value
+
+    def put(self, key, value):
+        if key in self:
+            self.get(key)
+            return
+
+        self.probation[key] = value
+        self.evict()
+
+    def evict(self):
+        evicted = []
+        while len(self) > self.max_size:
+            if self.probation:
+                evicted.append(self.probation.popitem(last=False))
+            else:
+                evicted.append(self.protected.popitem(last=False))
+        return evicted
+
+    def peek_victim(self):
+        if self.probation:
+            return next(iter(self.probation))
+        if self.protected:
+            return next(iter(self.protected))
+        return None
+
+    def __contains__(self, key):
+        return key in self.probation or key in self.protected
+
+    def __len__(self):
+        return len(self.probation) + len(self.protected)
+
+    def clear(self):
+        self.probation.clear()
+        self.protected.clear()
+
+
+class FrequencySketch:
+    """
+    Count-Min sketch de 4 filas con contadores saturados en 15.
+    Cada sample_size incrementos se dividen a la mitad (envejecimiento).
+    """
+
+    DEPTH = 4
+    _SEEDS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+
+    def __init__(self, max_size):
+        width = 1
+        while width < max(16, max_size * 4):
+            width <<= 1
+        self.mask = width - 1
+        self.table = [[0] * width for _ in range(self.DEPTH)]
+        self.sample_size = max(10 * max_size, 100)
+        self.additions = 0
+
+    def _indexes(self, key):
+        h = hash(key)
+        return [hash((seed, h)) & self.mask for seed in self._SEEDS]
+
+    def increment(self, key):
+        added = False
+        for row, i in zip(self.table, self._indexes(key)):
+            if row[i] < 15:
+                row[i] += 1
+                added = True
+
+        if added:
+            self.additions += 1
+            if self.additions >= self.sample_size:
+                self._reset()
+
+    def frequency(self, key):
+        return min(row[i] for row, i in zip(self.table, self._indexes(key)))
+
+    def _reset(self):
+        for row in self.table:
+            for i, v in enumerate(row):
+                row[i] = v >> 1
+        self.additions //= 2
+
+    def clear(self):
+        for row in self.table:
+            row[:] = [0] * len(row)
+        self.additions = 0
+
+
+class TinyLFUPolicy:
+    """
+    W-TinyLFU: ventana LRU pequeña (window_ratio) + SLRU principal.
+    Al salir de la ventana, un candidato solo entra al principal si
+    su frecuencia estimada supera a la de la víctima. Resistente a
+    barridos de texto único (narración larga) sin perder los
+    strings recurrentes de UI / muletillas.
+    """
+
+    name = "tinylfu"
+
+    def __init__(self, max_size, window_ratio=0.01):
+        self.max_size = max_size
+        window_max = max(1, int(max_size * window_ratio))
+        self.window = LRUPolicy(window_max)
+        self.main = SLRUPolicy(max(1, max_size - window_max))
+        self.sketch = FrequencySketch(max_size)
+
+    def get(self, key):
+        self.sketch.increment(key)
+
+        value = self.window.get(key)
+        if value is not None:
+            return value
+        return self.main.get(key)
+
+    def put(self, key, value):
+        if key in self:
+            self.get(key)
+            return
+
+        self.window.data[key] = value
+        if len(self.window.data) <= self.window.max_size:
+            return
+
+        cand_key, cand_value = self.window.data.popitem(last=False)
+
+        if len(self.main) < self.main.max_size:
+            self.main.probation[cand_key] = cand_value
+            return
+
+        victim = self.main.peek_victim()
+        if self.sketch.frequency(cand_key) > self.sketch.frequency(victim):
+            self.main.probation[cand_key] = cand_value
+            self.main.evict()
+
+    def __contains__(self, key):
+        return key in self.window or key in self.main
+
+    def __len__(self):
+        return len(self.window) + len(self.main)
+
+    def clear(self):
+        self.window.clear()
+        self.main.clear()
+        self.sketch.clear()
+
+
+POLICIES = {
+    "lru": LRUPolicy,
+    "slru": SLRUPolicy,
+    "tinylfu": TinyLFUPolicy,
+}
+
+
+def make_policy(name, max_size):
+    try:
+        return POLICIES[name](max_size)
+    except KeyError:
+        raise ValueError(f"Política de cache desconocida: {name}") from None
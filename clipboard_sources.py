@@ -0,0 +1,209 @@
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+
+class ClipboardSource:
+    """
+    Fuente de cambios del clipboard.
+
+    Un hilo productor (_run) llama a _emit(texto) en cada cambio;
+    el consumidor itera changes(), que produce el texto nuevo
+    o None cada `tick` segundos sin cambios (para flush por timeout).
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f"clipboard-{self.name}",
+                daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        raise NotImplementedError
+
+    def _emit(self, text):
+        if text:
+            self._queue.put(text)
+
+    def _fallback_to_polling(self, reason):
+        """El backend de eventos murió → polling en este mismo hilo."""
+        print(f"[Clipboard] {reason} → polling")
+        fallback = PollingClipboardSource()
+        fallback._queue = self._queue
+        fallback._stopped = self._stopped
+        fallback._run()
+
+    def changes(self, tick=0.1):
+        self.start()
+        while not self._stopped.is_set():
+            try:
+                yield self._queue.get(timeout=tick)
+            except queue.Empty:
+                yield None
+
+
+# ==========================
+# POLLING (fallback, backoff adaptativo)
+# ==========================
+class PollingClipboardSource(ClipboardSource):
+    """
+    pyperclip.paste() con intervalo adaptativo:
+    poll_min justo después de un cambio, crece hasta poll_max en reposo
+    (poll_max = intervalo fijo anterior: nunca más lento que antes).
+    """
+
+    name = "polling"
+
+    def __init__(self, poll_min=0.05, poll_max=0.1, backoff=1.5):
+        super().__init__()
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.backoff = backoff
+
+    def _run(self):
+        import pyperclip
+
+        last = None
+        interval = self.poll_min
+
+        while not self._stopped.is_set():
+            try:
+                text = pyperclip.paste()
+            except Exception as e:
+                print(f"[Clipboard] Error leyendo clipboard: {e}")
+                text = last
+
+            if text != last:
+                last = text
+                self._emit(text)
+                interval = self.poll_min
+            else:
+                interval = min(interval * self.backoff, self.poll_max)
+
+            time.sleep(interval)
+
+
+# ==========================
+# WAYLAND (wl-paste --watch)
+# ==========================
+class WlPasteClipboardSource(ClipboardSource):
+    """
+    `wl-paste --watch echo` imprime una línea en cada cambio de selección;
+    solo entonces se lee el contenido. Sin polling.
+    """
+
+    name = "wl-paste"
+
+    def _run(self):
+        try:
+            proc = subprocess.Popen(
+                ["wl-paste", "--watch", "echo"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True
+            )
+        except OSError as e:
+            self._fallback_to_polling(f"wl-paste no arrancó ({e})")
+            return
+
+        try:
+            for _ in proc.stdout:
+                if self._stopped.is_set():
+                    break
+                result = subprocess.run(
+                    ["wl-paste", "--no-newline"],
+                    capture_output=True,
+                    text=True
+                )
+                if result.returncode == 0:
+                    self._emit(result.stdout)
+        finally:
+            proc.terminate()
+
+        if not self._stopped.is_set():
+            self._fallback_to_polling(f"wl-paste --watch terminó ({proc.wait()})")
+
+
+# ==========================
+# X11 (clipnotify: bloquea hasta cambio de selección)
+# ==========================
+class ClipnotifyClipboardSource(ClipboardSource):
+    """
+    `clipnotify` sale cuando cambia una selección X11 (XFixes);
+    entonces se lee el clipboard una vez.
+    """
+
+    name = "clipnotify"
+
+    def _run(self):
+        import pyperclip
+
+        while not self._stopped.is_set():
+            try:
+                result = subprocess.run(["clipnotify"], stderr=subprocess.DEVNULL)
+            except OSError as e:
+                self._fallback_to_polling(f"clipnotify no arrancó ({e})")
+                return
+            if result.returncode != 0:
+                self._fallback_to_polling("clipnotify falló")
+                return
+
+            try:
+                self._emit(pyperclip.paste())
+            except Exception as e:
+                print(f"[Clipboard] Error leyendo clipboard: {e}")
+
+
+# ==========================
+# FAKE (tests / scripts)
+# ==========================
+class FakeClipboardSource(ClipboardSource):
+    """Fuente en memoria: copy(texto) simula un cambio del clipboard."""
+
+    name = "fake"
+
+    def start(self):
+        pass
+
+    def copy(self, text):
+        self._emit(text)
+
+
+def create_clipboard_source(kind="auto"):
+    """
+    kind: auto | polling | wl-paste | clipnotify | fake
+    auto → evento nativo en Linux si está disponible, si no polling.
+    """
+    if kind == "polling":
+        return PollingClipboardSource()
+    if kind == "wl-paste":
+        return WlPasteClipboardSource()
+    if kind == "clipnotify":
+        return ClipnotifyClipboardSource()
+    if kind == "fake":
+        return FakeClipboardSource()
+
+    if sys.platform.startswith("linux"):
+        if os.environ.get("WAYLAND_DISPLAY") and shutil.which("wl-paste"):
+            return WlPasteClipboardSource()
+        if os.environ.get("DISPLAY") and shutil.which("clipnotify"):
+            return ClipnotifyClipboardSource()
+
+    return PollingClipboardSource()
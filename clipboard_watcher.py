@@ -1,16 +1,28 @@
 import time
-import pyperclip
 import asyncio
 import re
 
+from clipboard_sources import create_clipboard_source
+
 
 class ClipboardWatcher:
-    def __init__(self, speech_buffer, worker, loop, poll=0.1, max_len=500):
+    """
+    Consume cambios del clipboard (ClipboardSource) y decide:
+    trivial / cache / larga / corta (SpeechBuffer).
+    poll = tick para revisar el timeout del buffer sin cambios.
+    speculate_delay = segundos antes de traducir en background lo que
+    espera en el buffer (None → sin especulación).
+    """
+
+    def __init__(self, speech_buffer, worker, loop, poll=0.1, max_len=500, source=None,
+                 speculate_delay=None):
         self.speech_buffer = speech_buffer
         self.worker = worker
         self.loop = loop
         self.poll = poll
         self.max_len = max_len
+        self.source = source or create_clipboard_source()
+        self.speculate_delay = speculate_delay
 
         self.last_clipboard = None
         self.last_text = None  # ← antes last_japanese
@@ -32,74 +44,87 @@ class ClipboardWatcher:
     # MAIN LOOP
     # ==========================
     def start(self):
-        print("[Clipboard] escuchando...")
-
-        while True:
-            try:
-                texto = pyperclip.paste()
-
-                if not texto or texto == self.last_clipboard or len(texto) > self.max_len:
-                    self.try_force_flush()
-                    time.sleep(self.poll)
-                    continue
-
-                self.last_clipboard = texto
-                texto_limpio = texto.strip()
-
-                # evita spam exacto
-                if texto_limpio == self.last_text:
-                    self.try_force_flush()
-                    time.sleep(self.poll)
-                    continue
-
-                self.last_text = texto_limpio
-
-                # 🔴 TRIVIAL → NO TRADUCIR
-                if self.is_trivial(texto_limpio):
-                    self.speech_buffer.force_flush()
-                    time.sleep(self.poll)
-                    continue
-
-                # 🟢 CACHE HIT → inmediato
-                cached = self.worker.get_cached_translation(texto_limpio)
-                if cached:
-                    print("[Cache] HIT → inmediato")
-                    self.speech_buffer.force_flush()
-                    self.worker.set_current_translation(cached)
-                    time.sleep(self.poll)
-                    continue
-
-                # 🔵 LARGA
-                if not self.speech_buffer.is_short(texto_limpio):
-                    pending = self.speech_buffer.get_current()
-
-                    if pending:
-                        combined = pending + "\n" + texto_limpio
-                        self.speech_buffer.force_flush()
-                        asyncio.run_coroutine_threadsafe(
-                            self.worker.traducir_texto(combined),
-                            self.loop
-                        )
-                    else:
-                        asyncio.run_coroutine_threadsafe(
-                            self.worker.traducir_texto(texto_limpio),
-                            self.loop
-                        )
-
-                # 🟡 CORTA
-                else:
-                    flushed = self.speech_buffer.push(texto_limpio)
-                    if flushed:
-                        asyncio.run_coroutine_threadsafe(
-                            self.worker.traducir_texto(flushed),
-                            self.loop
-                        )
-
-            except Exception as e:
-                print(f"[Clipboard] Error: {e}")
+        print(f"[Clipboard] escuchando ({self.source.name})...")
+
+        # None = tick sin cambios (solo revisa el timeout del buffer)
+        for texto in self.source.changes(tick=self.poll):
+            if texto is not None:
+                try:
+                    self.handle_text(texto)
+                except Exception as e:
+                    print(f"[Clipboard] Error: {e}")
 
             self.try_force_flush()
-            time.sleep(self.poll)
+
+    def handle_text(self, texto: str):
+        if not texto or texto == self.last_clipboard or len(texto) > self.max_len:
+            return
+
+        self.last_clipboard = texto
+        texto_limpio = texto.strip()
+
+        # evita spam exacto
+        if texto_limpio == self.last_text:
+            return
+
+        self.last_text = texto_limpio
+
+        # 🔴 TRIVIAL → NO TRADUCIR
+        if self.is_trivial(texto_limpio):
+            self.speech_buffer.force_flush()
+            self._speculate(None)
+            return
+
+        # 🟢 CACHE HIT → inmediato
+        cached = self.worker.get_cached_translation(texto_limpio)
+        if cached:
+            print("[Cache] HIT → inmediato")
+            self.speech_buffer.force_flush()
+            self._speculate(None)
+            self.worker.set_current_translation(cached)
+            return
+
+        # 🔵 LARGA
+        if not self.speech_buffer.is_short(texto_limpio):
+            pending = self.speech_buffer.get_current()
+
+            if pending:
+                combined = pending + "\n" + texto_limpio
+                self.speech_buffer.force_flush()
+                asyncio.run_coroutine_threadsafe(
+                    self.worker.traducir_texto(combined),
+                    self.loop
+                )
+            else:
+                asyncio.run_coroutine_threadsafe(
+                    self.worker.traducir_texto(texto_limpio),
+                    self.loop
+                )
+
+        # 🟡 CORTA
+        else:
+            flushed = self.speech_buffer.push(texto_limpio)
+            if flushed:
+                asyncio.run_coroutine_threadsafe(
+                    self.worker.traducir_texto(flushed),
+                    self.loop
+                )
+            else:
+                # Mientras espera más fragmentos, ya se va traduciendo
+                self._speculate(self.speech_buffer.get_current())
+
+    # ==========================
+    # ESPECULACIÓN
+    # ==========================
+    def _speculate(self, texto):
+        """texto=None → cancela la especulación en curso."""
+        if self.speculate_delay is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(
+            self.worker.speculate(texto, delay=self.speculate_delay),
+            self.loop
+        )
 
     # ==========================
     # FORCE FLUSH
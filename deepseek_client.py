@@ -1,25 +1,128 @@
-# Versión SIN streaming (multi-idioma)
+# Versión con streaming SSE (multi-idioma)
 
+import asyncio
+import json
 import re
+import time
 import aiohttp
 
+from cache_keys import make_namespace
+from http_resilience import (
+    ApiError,
+    CircuitBreaker,
+    LatencyWindow,
+    backoff_delay,
+    hedged,
+    parse_retry_after
+)
 from names import KNOWN_NAMES
+from telemetry import prompt_tokens, prompt_cache_hit_tokens, prompt_tokens_saved
+from utils_text import NameIndex
 
 DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+DEEPSEEK_WARMUP_URL = "https://api.deepseek.com/models"
+
+# Trie de nombres (se construye una sola vez por proceso)
+KNOWN_NAME_INDEX = NameIndex(KNOWN_NAMES)
+
+# Regla fija del prompt slim: los nombres viajan por request
+NAMES_RULE = "- Known character names present in the text are given as [NAMES: ...].\n"
+
+# Formato de la línea [NAMES: ...] (subirlo si cambia → rota el namespace)
+NAMES_HEADER_VERSION = 1
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimación barata (sin tokenizer): ~4 caracteres ASCII por token,
+    ~1 token por carácter no ASCII (CJK).
+    """
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+# ==========================
+# BATCH (varios textos en un request)
+# ==========================
+BATCH_INSTRUCTIONS = (
+    "Translate each numbered item below independently.\n"
+    "Reply with every marker exactly as given (<<<1>>>, <<<2>>>, ...), "
+    "each one on its own line followed by the translation of that item. "
+    "Do not merge, skip or add items. No other text."
+)
+
+_BATCH_MARKER = re.compile(r"^[ \t]*<<<(\d+)>>>[ \t]*", re.M)
+
+
+def parse_batch_output(content: str, count: int):
+    """
+    Separa la respuesta batch por marcadores <<<n>>>.
+    Retorna la lista de traducciones en orden, o None si la salida
+    no trae exactamente un bloque no vacío por item.
+    """
+    parts = _BATCH_MARKER.split(content)
+
+    items = {}
+    for num, body in zip(parts[1::2], parts[2::2]):
+        i = int(num)
+        body = body.strip()
+        if i in items or not 1 <= i <= count or not body:
+            return None
+        items[i] = body
+
+    if len(items) != count:
+        return None
+
+    return [items[i] for i in range(1, count + 1)]
 
 
 class DeepSeekClient:
-    def __init__(self, api_key: str, target_language: str = "English"):
+    def __init__(
+        self,
+        api_key: str,
+        target_language: str = "English",
+        pool_limit: int = 8,
+        keepalive_timeout: float = 75,
+        dns_ttl: int = 600,
+        slim_prompt: bool = True,
+        api_url: str = DEEPSEEK_API_URL,
+        warmup_url: str = DEEPSEEK_WARMUP_URL,
+        max_retries: int = 3,
+        max_retry_after: float = 10.0,
+        hedge: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min: float = 1.0,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 30.0
+    ):
         if not api_key:
             raise RuntimeError("DeepSeek API key no configurada")
 
         self.api_key = api_key
         self.target_language = target_language
+        self.model = "deepseek-chat"
+
+        # Sesión HTTP compartida (keep-alive); se crea dentro del loop
+        self.pool_limit = pool_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self._session = None
+        self._inflight = 0
+
+        # Transporte: reintentos + hedging (p95) + circuit breaker
+        self.api_url = api_url
+        self.warmup_url = warmup_url
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min = hedge_min
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self._latency = {"once": LatencyWindow(), "stream": LatencyWindow()}
 
         # Separador neutro
         known_list = ", ".join(sorted(KNOWN_NAMES))
 
-        self.system_prompt = (
+        prompt_head = (
             "You are a translation engine for narration and dialogue.\n\n"
 
             "TASK:\n"
@@ -32,10 +135,10 @@ class DeepSeekClient:
             "- If [SPEAKER: Name] is provided, use it to understand who is speaking.\n"
             "- If no speaker is given, treat the line as narration.\n"
             "- Character names are never sounds or interjections.\n"
-            "- Known character names:\n"
-            f"{known_list}\n\n"
-
-            "OUTPUT:\n"
+        )
+        names_block = f"- Known character names:\n{known_list}\n"
+        prompt_tail = (
+            "\nOUTPUT:\n"
             "- Translate ONLY the dialogue or narration.\n"
             "- Do NOT include the speaker name in the output.\n"
             "- Preserve honorifics (san, chan, kun, senpai, sama).\n"
@@ -43,6 +146,34 @@ class DeepSeekClient:
             "- Output ONLY the translation. No comments."
         )
 
+        # Prompt completo (lista entera de nombres)
+        full_prompt = prompt_head + names_block + prompt_tail
+
+        # Slim: prefijo idéntico en todos los requests (cacheable en la API);
+        # solo los nombres que aparecen en el texto van en [NAMES: ...]
+        self.slim_prompt = slim_prompt
+        if slim_prompt:
+            self.system_prompt = prompt_head + NAMES_RULE + prompt_tail
+        else:
+            self.system_prompt = full_prompt
+        self._names_block_tokens = estimate_tokens(names_block) - estimate_tokens(NAMES_RULE)
+
+        # Namespace de cache: idioma + modelo + lo que realmente se envía
+        # (prompt de sistema y, en slim, el formato del header de nombres)
+        sent_prompt = self.system_prompt
+        if slim_prompt:
+            sent_prompt += f"\n[NAMES v{NAMES_HEADER_VERSION}]"
+        self.cache_namespace = make_namespace(
+            self.target_language,
+            self.model,
+            sent_prompt
+        )
+
+        # Namespace anterior (huella del prompt completo, con o sin slim):
+        # sus entradas se migran explícitamente con claim_legacy()
+        legacy = make_namespace(self.target_language, self.model, full_prompt)
+        self.legacy_namespaces = [legacy] if legacy != self.cache_namespace else []
+
     # ==========================
     # SPEAKER DETECTION
     # ==========================
@@ -53,7 +184,7 @@ class DeepSeekClient:
 
         # 1️⃣ Name: text (latino)
         m = re.match(r"^([A-Z][a-z]{1,20})[：:]\s*(.+)?", text)
-        if m and m.group(1) in KNOWN_NAMES:
+        if m and m.group(1) in KNOWN_NAME_INDEX:
             return m.group(1), (m.group(2) or "").strip()
 
         # Limpieza básica de comillas
@@ -63,44 +194,256 @@ class DeepSeekClient:
         lines = t.split("\n")
         if len(lines) >= 2:
             name = lines[0].strip()
-            if name in KNOWN_NAMES:
+            if name in KNOWN_NAME_INDEX:
                 return name, "\n".join(lines[1:]).strip()
 
         # 3️⃣ / 4️⃣ Nombre pegado o con separador
-        for name in KNOWN_NAMES:
-            if t.startswith(name):
-                rest = t[len(name):].lstrip(" :：,")
-                if rest:
-                    return name, rest.strip()
+        name, rest = KNOWN_NAME_INDEX.match_prefix(t, " :：,")
+        if name:
+            return name, rest
 
         return None, text
 
+    # ==========================
+    # PROMPT SLIM (nombres por request)
+    # ==========================
+    def _names_header(self, *texts):
+        """
+        Línea [NAMES: ...] con los nombres conocidos que aparecen en los
+        textos del request. Retorna (header, cantidad, tokens ahorrados ≈).
+        """
+        if not self.slim_prompt:
+            return "", 0, 0
+
+        names = KNOWN_NAME_INDEX.find_all(*texts)
+        header = f"[NAMES: {', '.join(sorted(names))}]\n" if names else ""
+        return header, len(names), self._names_block_tokens - estimate_tokens(header)
+
+    def _record_prompt(self, usage, names, saved):
+        """Tokens de entrada reales (usage de la API) + ahorro estimado."""
+        prompt = usage.get("prompt_tokens")
+        cached = usage.get("prompt_cache_hit_tokens") or 0
+
+        if prompt is not None:
+            prompt_tokens.record(prompt)
+            prompt_cache_hit_tokens.add(cached)
+        if self.slim_prompt:
+            prompt_tokens_saved.add(max(saved, 0))
+
+        print(
+            f"[Prompt] 📊 tokens={prompt if prompt is not None else '?'} "
+            f"(cache hit={cached}) | nombres {names}/{len(KNOWN_NAMES)} | ahorro ≈{saved}"
+        )
+
+    # ==========================
+    # SESIÓN HTTP (keep-alive)
+    # ==========================
+    def _get_session(self):
+        """
+        Devuelve la sesión compartida, creándola en el loop actual.
+        Una sola sesión = conexiones TCP/TLS reutilizadas + DNS cacheado.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+                enable_cleanup_closed=True
+            )
+            # sock_read: un stream colgado se corta (y se reintenta) sin esperar el total
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=60, connect=10, sock_read=30)
+            )
+        return self._session
+
+    async def start(self, warmup: bool = True):
+        """Crea la sesión en el loop del worker y (opcional) abre la conexión."""
+        self._get_session()
+        if warmup:
+            await self.warmup()
+
+    async def warmup(self):
+        """
+        Petición barata para resolver DNS y completar TCP+TLS antes
+        de la primera traducción. Los errores se ignoran.
+        """
+        try:
+            async with self._get_session().get(
+                self.warmup_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=aiohttp.ClientTimeout(total=10),
+            ) as resp:
+                await resp.read()
+                print(f"[DeepSeek] 🔥 Conexión precalentada ({resp.status})")
+        except Exception as e:
+            print(f"[DeepSeek] Warm-up falló: {e}")
+
+    async def close(self, grace: float = 30):
+        """
+        Cierra el pool. Espera (hasta grace s) a que terminen las
+        peticiones en curso; usado al apagar y en el hot reload.
+        """
+        waited = 0.0
+        while self._inflight and waited < grace:
+            await asyncio.sleep(0.1)
+            waited += 0.1
+
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    # ==========================
+    # TRANSPORTE (reintentos + hedging + circuit breaker)
+    # ==========================
+    def _hedge_delay(self, kind):
+        """p95 de la latencia reciente (None → sin hedge todavía)."""
+        if not self.hedge:
+            return None
+        p = self._latency[kind].percentile(self.hedge_percentile)
+        return None if p is None else max(self.hedge_min, p)
+
+    async def _call(self, kind, attempt, discard=None):
+        """
+        attempt(): un request (lanza ApiError / errores de red).
+        kind: "once" (respuesta completa) | "stream" (hasta el primer token).
+        Reintenta con backoff + jitter (o lo que diga Retry-After);
+        con el circuito abierto falla al instante (CircuitOpenError).
+        """
+        for n in range(self.max_retries + 1):
+            self.breaker.before_call()
+            t_start = time.monotonic()
+            try:
+                result = await hedged(
+                    attempt,
+                    self._hedge_delay(kind),
+                    discard=discard,
+                    on_hedge=lambda: print(f"[DeepSeek] 🐢 Hedge: segundo request ({kind})")
+                )
+
+            except asyncio.CancelledError:
+                self.breaker.release_probe()
+                raise
+
+            except (ApiError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, ApiError) and not e.retryable:
+                    # 4xx: la API está viva, el request es el problema
+                    self.breaker.record_success()
+                    raise
+
+                hold = getattr(e, "retry_after", None)
+                too_long = hold is not None and hold > self.max_retry_after
+                self.breaker.record_failure(hold if too_long else None)
+
+                if n == self.max_retries or too_long or self.breaker.state == "open":
+                    raise
+
+                wait = hold if hold is not None else backoff_delay(n)
+                print(f"[DeepSeek] 🔁 Reintento {n + 1}/{self.max_retries} en {wait:.1f}s ({str(e) or type(e).__name__})")
+                await asyncio.sleep(wait)
+                continue
+
+            except Exception:
+                # Respuesta rota (JSON / SSE inválido): fallo sin reintento;
+                # nunca deja la prueba half-open tomada
+                self.breaker.record_failure()
+                raise
+
+            self._latency[kind].add(time.monotonic() - t_start)
+            self.breaker.record_success()
+            return result
+
     # ==========================
     # INTERNAL REQUEST (NO STREAM)
     # ==========================
-    async def _request_once(self, payload, headers):
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                DEEPSEEK_API_URL,
+    async def _request_once(self, payload, headers, usage=None):
+        async def attempt():
+            async with self._get_session().post(
+                self.api_url,
                 json=payload,
                 headers=headers,
-                timeout=aiohttp.ClientTimeout(total=60),
             ) as resp:
+                await _check_status(resp)
+                return await resp.json()
 
-                if resp.status != 200:
-                    raise RuntimeError(await resp.text())
+        self._inflight += 1
+        try:
+            data = await self._call("once", attempt)
+        finally:
+            self._inflight -= 1
 
-                data = await resp.json()
-                return data["choices"][0]["message"]["content"]
+        if usage is not None:
+            usage.update(data.get("usage") or {})
+        return data["choices"][0]["message"]["content"]
 
     # ==========================
-    # PUBLIC TRANSLATE (NO STREAM)
+    # INTERNAL REQUEST (STREAM SSE)
     # ==========================
-    def translate_stream(self, text: str, context: str = ""):
-        async def _gen():
+    async def _request_stream(self, payload, headers, usage=None):
+        """
+        Yields los fragmentos de texto (delta.content) a medida
+        que llegan los eventos SSE `data: {...}` del endpoint.
+        usage (dict): se completa con el evento final de uso, si llega.
+        Reintentos / hedge solo hasta el primer fragmento
+        (después ya hay texto en el overlay).
+        """
+        async def attempt():
+            resp = await self._get_session().post(
+                self.api_url,
+                json=payload,
+                headers=headers,
+            )
+            try:
+                await _check_status(resp)
+                deltas = _sse_deltas(resp, usage)
+                try:
+                    first = await deltas.__anext__()
+                except StopAsyncIteration:
+                    first = None
+                return resp, deltas, first
+            except BaseException:
+                resp.close()
+                raise
+
+        self._inflight += 1
+        try:
+            resp, deltas, first = await self._call(
+                "stream", attempt, discard=lambda opened: opened[0].close()
+            )
+            try:
+                if first:
+                    yield first
+                    async for delta in deltas:
+                        yield delta
+            finally:
+                resp.release()
+        finally:
+            self._inflight -= 1
+
+    # ==========================
+    # PUBLIC TRANSLATE (STREAM)
+    # ==========================
+    @staticmethod
+    def uses_context(context: str, dialogue: str, force_context: bool = False) -> bool:
+        """
+        Si translate_stream envía el contexto: por defecto solo con diálogo
+        de más de 15 caracteres; force_context (líneas del mismo bloque) siempre.
+        """
+        return bool(context and dialogue and (force_context or len(dialogue) > 15))
+
+    def translate_stream(self, text: str, context: str = "", speaker=None, dialogue=None,
+                         force_context: bool = False):
+        """
+        speaker/dialogue: detección ya hecha por el caller (el worker),
+        así no se repite. Si no vienen, se detecta aquí.
+        """
+        if dialogue is None:
             speaker, dialogue = self._extract_speaker(text)
 
-            use_context = bool(context and dialogue and len(dialogue) > 15)
+        async def _gen():
+
+            use_context = self.uses_context(context, dialogue, force_context)
 
             messages = []
 
@@ -123,14 +466,19 @@ class DeepSeekClient:
             if speaker:
                 content = f"[SPEAKER: {speaker}]\n{content}"
 
+            names, n_names, saved = self._names_header(
+                speaker, dialogue, context if use_context else ""
+            )
+
             messages.append({
                 "role": "user",
-                "content": content
+                "content": names + content
             })
 
             payload = {
-                "model": "deepseek-chat",
-                "stream": False,
+                "model": self.model,
+                "stream": True,
+                "stream_options": {"include_usage": True},
                 "temperature": 0.25,
                 "messages": messages
             }
@@ -140,12 +488,116 @@ class DeepSeekClient:
                 "Content-Type": "application/json",
             }
 
-            result = await self._request_once(payload, headers)
+            # Prefijo SOLO para UI: va pegado al primer token real
+            # (sin parcial "Nombre:" vacío y sin falsear el first_chunk_ms)
+            prefix = f"{speaker}: " if speaker else ""
 
-            # Prefijo SOLO para UI
-            if speaker:
-                yield f"{speaker}: {result}"
-            else:
-                yield result
+            usage = {}
+            async for chunk in self._request_stream(payload, headers, usage):
+                yield prefix + chunk
+                prefix = ""
+
+            self._record_prompt(usage, n_names, saved)
 
         return _gen()
+
+    # ==========================
+    # PUBLIC TRANSLATE (BATCH)
+    # ==========================
+    async def translate_batch(self, items, context: str = ""):
+        """
+        items: lista de (speaker, dialogue) ya detectados por el worker.
+        Un solo request (sin stream) con marcadores numerados.
+        Retorna la lista de traducciones (con prefijo de speaker)
+        o None si la salida no se pudo repartir → el caller
+        vuelve a requests individuales.
+        """
+        blocks = []
+        for i, (speaker, dialogue) in enumerate(items, 1):
+            content = dialogue
+            if speaker:
+                content = f"[SPEAKER: {speaker}]\n{content}"
+            blocks.append(f"<<<{i}>>>\n{content}")
+
+        names, n_names, saved = self._names_header(
+            context, *(text for item in items for text in item)
+        )
+
+        messages = [{
+            "role": "system",
+            "content": self.system_prompt,
+            "cache_control": {"type": "ephemeral"}
+        }]
+
+        if context:
+            messages.append({
+                "role": "user",
+                "content": f"Previous lines:\n{context}"
+            })
+
+        messages.append({
+            "role": "user",
+            "content": names + BATCH_INSTRUCTIONS + "\n\n" + "\n".join(blocks)
+        })
+
+        payload = {
+            "model": self.model,
+            "temperature": 0.25,
+            "messages": messages
+        }
+
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+        usage = {}
+        content = await self._request_once(payload, headers, usage)
+        self._record_prompt(usage, n_names, saved)
+
+        translations = parse_batch_output(content, len(items))
+        if translations is None:
+            return None
+
+        return [
+            f"{speaker}: {text}" if speaker else text
+            for (speaker, _), text in zip(items, translations)
+        ]
+
+
+# ==========================
+# HELPERS HTTP
+# ==========================
+async def _check_status(resp):
+    if resp.status != 200:
+        raise ApiError(
+            resp.status,
+            await resp.text(),
+            parse_retry_after(resp.headers.get("Retry-After"))
+        )
+
+
+async def _sse_deltas(resp, usage):
+    """Fragmentos delta.content del stream SSE (ignora keep-alive)."""
+    async for raw in resp.content:
+        line = raw.decode("utf-8").strip()
+
+        # líneas vacías / comentarios keep-alive
+        if not line.startswith("data:"):
+            continue
+
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+
+        event = json.loads(data)
+        if usage is not None and event.get("usage"):
+            usage.update(event["usage"])
+
+        choices = event.get("choices") or []
+        if not choices:
+            continue
+
+        delta = choices[0].get("delta", {}).get("content")
+        if delta:
+            yield delta
@@ -0,0 +1,195 @@
+import hashlib
+import re
+import struct
+import threading
+import unicodedata
+from collections import Counter
+
+
+# 32 valores MinHash de 16 bits salen de un solo digest blake2b de 64 bytes
+_DIGEST = struct.Struct("<32H")
+NUM_PERM = 32
+
+# Ruido que no cambia el significado: puntuación, espacios, símbolos
+_NOISE = re.compile(r"[\W_]+")
+
+
+def fuzzy_text(text: str) -> str:
+    """
+    Normalización agresiva SOLO para similitud:
+    NFKC (ancho completo → medio), casefold, sin puntuación/espacios.
+    """
+    t = unicodedata.normalize("NFKC", text).casefold()
+    return _NOISE.sub("", t)
+
+
+def verify_text(text: str) -> str:
+    """
+    Forma para verificar un candidato: NFKC y espacios colapsados,
+    CON puntuación y mayúsculas ("？", "can't" cambian el sentido).
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def _terminal_punct(t: str) -> str:
+    """Puntuación final ("?", "!", "...", "") de un texto verify_text."""
+    end = len(t)
+    while end and unicodedata.category(t[end - 1]).startswith("P"):
+        end -= 1
+    return t[end:]
+
+
+def edit_distance(a: str, b: str, max_edits: int) -> int:
+    """Levenshtein acotado: retorna max_edits + 1 apenas se supera."""
+    if abs(len(a) - len(b)) > max_edits:
+        return max_edits + 1
+
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > max_edits:
+            return max_edits + 1
+        prev = cur
+    return prev[-1]
+
+
+class FuzzyIndex:
+    """
+    Tier de similitud detrás de los tiers exactos.
+
+    - Shingles de n caracteres → firma MinHash (NUM_PERM valores)
+    - LSH por bandas: candidatos = claves que comparten alguna banda
+      (lookup por hash, sublineal en la cantidad de claves)
+    - Verificación: Jaccard real de los n-gramas ≥ threshold, y sobre el
+      texto CON puntuación: misma puntuación final y ≤ max_edits caracteres
+      editados (solo ruido OCR / clipboard, nunca otra frase)
+    """
+
+    def __init__(self, threshold=0.8, ngram=2, bands=8, min_len=6, max_candidates=64,
+                 max_edits=1):
+        if NUM_PERM % bands:
+            raise ValueError("bands debe dividir NUM_PERM")
+
+        self.threshold = threshold
+        self.ngram = ngram
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.min_len = min_len
+        self.max_candidates = max_candidates
+        self.max_edits = max_edits
+
+        self.lock = threading.Lock()
+        self._entries = []   # id -> (ns, key, fuzzy_text)
+        self._ids = {}       # (ns, key) -> id
+        self._buckets = {}   # hash(ns, banda, valores) -> [ids]
+
+    # ==========================
+    # FIRMA
+    # ==========================
+    def _grams(self, ft: str):
+        n = self.ngram
+        if len(ft) <= n:
+            return {ft}
+        return {ft[i:i + n] for i in range(len(ft) - n + 1)}
+
+    def _signature(self, grams):
+        digests = [
+            _DIGEST.unpack(hashlib.blake2b(g.encode(), digest_size=64).digest())
+            for g in grams
+        ]
+        return [min(col) for col in zip(*digests)]
+
+    def _band_keys(self, ns, signature):
+        r = self.rows
+        return [
+            hash((ns, b, *signature[b * r:(b + 1) * r]))
+            for b in range(self.bands)
+        ]
+
+    # ==========================
+    # INDEXAR
+    # ==========================
+    def add(self, ns: str, key: str):
+        """Indexa una clave de cache (las hasheadas '#...' no tienen texto)."""
+        if key.startswith("#"):
+            return
+
+        ft = fuzzy_text(key)
+        if len(ft) < self.min_len:
+            return
+
+        band_keys = self._band_keys(ns, self._signature(self._grams(ft)))
+
+        with self.lock:
+            if (ns, key) in self._ids:
+                return
+            entry_id = len(self._entries)
+            self._entries.append((ns, key, ft))
+            self._ids[(ns, key)] = entry_id
+            for bk in band_keys:
+                self._buckets.setdefault(bk, []).append(entry_id)
+
+    def build(self, items):
+        """items: iterable de (ns, key). Pensado para correr en background."""
+        count = 0
+        for ns, key in items:
+            self.add(ns, key)
+            count += 1
+        print(f"[Fuzzy] Índice listo: {len(self)} claves (de {count})")
+
+    def __len__(self):
+        with self.lock:
+            return len(self._entries)
+
+    # ==========================
+    # LOOKUP
+    # ==========================
+    def lookup(self, text: str, ns: str = ""):
+        """
+        Retorna (key, score) de la clave más parecida con score ≥ threshold,
+        o None.
+        """
+        ft = fuzzy_text(text)
+        if len(ft) < self.min_len:
+            return None
+
+        grams = self._grams(ft)
+        band_keys = self._band_keys(ns, self._signature(grams))
+
+        # Candidatos ordenados por cantidad de bandas compartidas
+        with self.lock:
+            shared = Counter()
+            for bk in band_keys:
+                shared.update(self._buckets.get(bk, ()))
+            candidates = [
+                self._entries[entry_id]
+                for entry_id, _ in shared.most_common(self.max_candidates)
+            ]
+
+        scored = []
+        for cand_ns, key, cand_ft in candidates:
+            if cand_ns != ns:
+                continue
+            if cand_ft == ft:
+                scored.append((1.0, key))
+                continue
+
+            cand_grams = self._grams(cand_ft)
+            score = len(grams & cand_grams) / len(grams | cand_grams)
+            if score >= self.threshold:
+                scored.append((score, key))
+
+        vt = verify_text(text)
+        for score, key in sorted(scored, reverse=True):
+            if self._same_sentence(vt, verify_text(key)):
+                return key, score
+
+        return None
+
+    def _same_sentence(self, a: str, b: str) -> bool:
+        return (
+            _terminal_punct(a) == _terminal_punct(b)
+            and edit_distance(a, b, self.max_edits) <= self.max_edits
+        )
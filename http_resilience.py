@@ -0,0 +1,177 @@
+import asyncio
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+
+# ==========================
+# ERRORES
+# ==========================
+# Status que vale la pena reintentar (sobrecarga / fallos transitorios)
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class ApiError(RuntimeError):
+    """Respuesta no-200 de la API (mensaje corto, apto para el overlay)."""
+
+    def __init__(self, status, body="", retry_after=None):
+        self.status = status
+        self.retry_after = retry_after
+        self.retryable = status in RETRYABLE_STATUS
+
+        detail = " ".join(body.split())[:160]
+        super().__init__(f"HTTP {status}: {detail}" if detail else f"HTTP {status}")
+
+
+class CircuitOpenError(RuntimeError):
+    """El circuito está abierto: se falla sin llamar a la API."""
+
+    def __init__(self, remaining):
+        self.remaining = remaining
+        super().__init__(f"API no disponible (reintento en {remaining:.0f}s)")
+
+
+def parse_retry_after(value):
+    """Retry-After en segundos o fecha HTTP → segundos (o None)."""
+    if not value:
+        return None
+
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """Backoff exponencial con full jitter (attempt empieza en 0)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# ==========================
+# LATENCIA (p95 para hedging)
+# ==========================
+class LatencyWindow:
+    """Últimas N latencias (s); percentiles sobre la ventana."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, p):
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+# ==========================
+# CIRCUIT BREAKER
+# ==========================
+class CircuitBreaker:
+    """
+    closed → open tras `threshold` fallos seguidos; mientras está abierto
+    todo falla al instante. Pasado el cooldown deja pasar UNA prueba
+    (half-open): éxito → closed, fallo → open otra vez.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self._probing = False
+
+    @property
+    def state(self):
+        if self.open_until == 0.0:
+            return "closed"
+        if time.monotonic() < self.open_until:
+            return "open"
+        return "half-open"
+
+    def before_call(self):
+        """Lanza CircuitOpenError si no se debe llamar a la API."""
+        state = self.state
+        if state == "open" or (state == "half-open" and self._probing):
+            raise CircuitOpenError(max(0.0, self.open_until - time.monotonic()))
+        if state == "half-open":
+            self._probing = True
+
+    def record_success(self):
+        if self.open_until:
+            print("[DeepSeek] ✅ Circuito cerrado (API respondió)")
+        self.failures = 0
+        self.open_until = 0.0
+        self._probing = False
+
+    def record_failure(self, hold=None):
+        """hold: segundos mínimos abierto (p.ej. un Retry-After largo)."""
+        self.failures += 1
+        if self._probing or self.failures >= self.threshold or hold:
+            wait = max(self.cooldown, hold or 0.0)
+            self.open_until = time.monotonic() + wait
+            print(f"[DeepSeek] ⛔ Circuito abierto {wait:.0f}s ({self.failures} fallos seguidos)")
+        self._probing = False
+
+    def release_probe(self):
+        """La prueba half-open terminó sin veredicto (cancelada)."""
+        self._probing = False
+
+
+# ==========================
+# HEDGING
+# ==========================
+async def hedged(attempt, delay, discard=None, on_hedge=None):
+    """
+    Corre attempt(); si no termina en `delay` s lanza una segunda copia
+    y se queda con la primera que responde bien (la otra se cancela).
+    discard(result): libera un resultado ganador que llegó tarde.
+    """
+    first = asyncio.ensure_future(attempt())
+    if delay is None:
+        return await first
+
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            if on_hedge:
+                on_hedge()
+            tasks.add(asyncio.ensure_future(attempt()))
+
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            winners = [t for t in done if t.exception() is None]
+            for t in done:
+                if t.exception() is not None:
+                    error = t.exception()
+            if winners:
+                for extra in winners[1:]:
+                    if discard:
+                        discard(extra.result())
+                return winners[0].result()
+
+        raise error
+    finally:
+        for t in tasks:
+            t.cancel()
+            t.add_done_callback(lambda t: _settle(t, discard))
+
+
+def _settle(task, discard):
+    """Perdedor cancelado: consume su error o libera su resultado."""
+    if task.cancelled():
+        return
+    if task.exception() is None and discard:
+        discard(task.result())
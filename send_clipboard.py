@@ -1,24 +1,44 @@
 import asyncio
+import atexit
+import json
+import os
 import threading
 import logging
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 
 from config_manager import ConfigManager
 from deepseek_client import DeepSeekClient
 from translation_cache import TranslationCache
-from sqlite_store import SQLiteTranslationStore
+from sqlite_store import SQLiteTranslationStore, SEARCH_RANK_WINDOW
+from fuzzy_index import FuzzyIndex
 from speech_buffer import SpeechBuffer
 from names import KNOWN_NAMES
 
 from translation_worker import TranslationWorker
 from clipboard_watcher import ClipboardWatcher
+from clipboard_sources import create_clipboard_source
 
 # ==========================
 # CONFIG
 # ==========================
 CLIPBOARD_POLL = 0.1
+CLIPBOARD_SOURCE = "auto"   # auto | polling | wl-paste | clipnotify
 PORT = 5000
+# flask (hilos) | async (aiohttp en el loop del worker)
+SERVER_MODE = os.environ.get("DSTRANSLATOR_SERVER", "flask")
 PENDING_MAX = 20
+MAX_CONCURRENCY = 3
+BATCH_MAX = 8            # textos por request con backlog (1 = sin batch)
+HEDGE_REQUESTS = False   # True → segundo request (pagado) si el primero pasa el p95
+SPECULATE_DELAY = 0.5    # traducir el SpeechBuffer antes del flush (None = off)
+CACHE_POLICY = "slru"    # lru | slru | tinylfu (ver bench_cache_policies.py)
+FUZZY_THRESHOLD = None   # p.ej. 0.8 → tier fuzzy (opcional)
+HISTORY_MAX_LIMIT = 200
+# translations.db: presupuesto en disco + compresión de valores largos
+SQLITE_MAX_BYTES = 256 * 1024 * 1024
+SQLITE_EVICT_POLICY = "lfu"   # lru | lfu
+SQLITE_COMPRESS = "zlib"      # None | zlib | zstd
+PACKS_DIR = "packs"       # *.db de solo lectura detrás de translations.db (orden alfabético)
 
 # ==========================
 # Flask
@@ -39,14 +59,36 @@ deepseek = None
 if api_key:
     deepseek = DeepSeekClient(
         api_key=api_key,
-        target_language=target_language
+        target_language=target_language,
+        hedge=HEDGE_REQUESTS
     )
 else:
     print("[Config] ⚠ No API key configurada. Esperando configuración del usuario.")
 
 
-cache = TranslationCache(max_size=500)
-sqlite_cache = SQLiteTranslationStore()
+cache = TranslationCache(
+    max_size=500,
+    policy=CACHE_POLICY,
+    trace_path=os.environ.get("DSTRANSLATOR_CACHE_TRACE")
+)
+atexit.register(cache.close)
+# Write-behind: la persistencia sale del hot path (flush por lotes)
+sqlite_cache = SQLiteTranslationStore(
+    write_behind=True,
+    max_bytes=SQLITE_MAX_BYTES,
+    evict_policy=SQLITE_EVICT_POLICY,
+    compress=SQLITE_COMPRESS
+)
+atexit.register(sqlite_cache.close)
+
+# Packs precalculados (p.ej. uno por juego); el store propio siempre gana
+if os.path.isdir(PACKS_DIR):
+    for name in sorted(os.listdir(PACKS_DIR)):
+        if name.endswith(".db"):
+            try:
+                sqlite_cache.attach_pack(os.path.join(PACKS_DIR, name))
+            except Exception as e:
+                print(f"[SQLite] ⚠ Pack ignorado {name}: {e}")
 
 # ✅ BATCHING FINAL:
 # - cortas (<10) se juntan hasta 3
@@ -57,12 +99,25 @@ speech_buffer = SpeechBuffer(
     short_max_lines=3
 )
 
+# Tier fuzzy: índice MinHash sobre las claves guardadas (se arma en background)
+fuzzy_index = None
+if FUZZY_THRESHOLD is not None:
+    fuzzy_index = FuzzyIndex(threshold=FUZZY_THRESHOLD)
+    threading.Thread(
+        target=fuzzy_index.build,
+        args=(sqlite_cache.iter_keys(),),
+        daemon=True
+    ).start()
+
 worker = TranslationWorker(
     deepseek=deepseek,
     cache=cache,
     sqlite_cache=sqlite_cache,
     KNOWN_NAMES=KNOWN_NAMES,
-    pending_max=PENDING_MAX
+    pending_max=PENDING_MAX,
+    max_concurrency=MAX_CONCURRENCY,
+    fuzzy=fuzzy_index,
+    batch_max=BATCH_MAX
 )
 
 # ==========================
@@ -79,6 +134,38 @@ threading.Thread(
     daemon=True
 ).start()
 
+# ==========================
+# Ciclo de vida del cliente HTTP (sesión keep-alive en el loop)
+# ==========================
+def start_client(client):
+    # Filas previas a los namespaces (o de un formato anterior) → namespace actual
+    sqlite_cache.claim_legacy(client.cache_namespace)
+    for legacy in client.legacy_namespaces:
+        sqlite_cache.claim_legacy(client.cache_namespace, legacy)
+    asyncio.run_coroutine_threadsafe(client.start(warmup=True), loop)
+
+    # Warm-up de la RAM en background (no retrasa al servidor)
+    threading.Thread(
+        target=worker.warm_start,
+        kwargs={"namespace": client.cache_namespace},
+        daemon=True
+    ).start()
+
+def close_client(client):
+    return asyncio.run_coroutine_threadsafe(client.close(), loop)
+
+def shutdown_client():
+    if worker.deepseek:
+        try:
+            close_client(worker.deepseek).result(timeout=2)
+        except Exception:
+            pass
+
+if deepseek:
+    start_client(deepseek)
+
+atexit.register(shutdown_client)
+
 # ==========================
 # Clipboard watcher
 # ==========================
@@ -86,7 +173,9 @@ watcher = ClipboardWatcher(
     speech_buffer=speech_buffer,
     worker=worker,
     loop=loop,
-    poll=CLIPBOARD_POLL
+    poll=CLIPBOARD_POLL,
+    source=create_clipboard_source(CLIPBOARD_SOURCE),
+    speculate_delay=SPECULATE_DELAY
 )
 
 # ==========================
@@ -96,6 +185,40 @@ watcher = ClipboardWatcher(
 def get_translation():
     return jsonify(worker.get_current_translation())
 
+@app.route("/api/translation/poll", methods=["GET"])
+def poll_translation():
+    """
+    Long-poll: responde cuando rev > since (o al timeout).
+    El overlay usa el rev recibido como siguiente cursor.
+    """
+    since = request.args.get("since", default=-1, type=int)
+    timeout = min(request.args.get("timeout", default=25, type=float), 60)
+    return jsonify(worker.wait_for_update(since, timeout))
+
+@app.route("/api/translation/stream", methods=["GET"])
+def stream_translation():
+    """
+    Server-Sent Events: un evento `translation` por publicación
+    (incluye parciales). Reanuda desde Last-Event-ID.
+    """
+    since = request.headers.get("Last-Event-ID", default=-1, type=int)
+
+    def events():
+        rev = since
+        while True:
+            state = worker.wait_for_update(rev, timeout=15)
+            if state["rev"] <= rev:
+                yield ": keep-alive\n\n"
+                continue
+            rev = state["rev"]
+            yield f"id: {rev}\nevent: translation\ndata: {json.dumps(state)}\n\n"
+
+    return Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route("/api/reset", methods=["POST"])
 def reset():
     worker.reset_state()
@@ -104,15 +227,47 @@ def reset():
 
 @app.route("/api/cache/stats", methods=["GET"])
 def get_cache_stats():
-    return jsonify(cache.get_stats())
+    return jsonify(dict(cache.get_stats(), sqlite=sqlite_cache.disk_stats()))
 
 @app.route("/api/history", methods=["GET"])
 def get_history():
-    return jsonify(sqlite_cache.get_last(limit=30))
+    # Paginación por cursor: ?cursor=<X-Next-Cursor de la página anterior>
+    limit = max(1, min(request.args.get("limit", 30, type=int), HISTORY_MAX_LIMIT))
+    cursor = request.args.get("cursor", type=int)
 
-@app.route("/api/config", methods=["POST"])
-def save_config():
-    data = request.json or {}
+    items, next_cursor = sqlite_cache.get_history(
+        limit=limit, namespace=worker.namespace, cursor=cursor
+    )
+    resp = jsonify(items)
+    if next_cursor is not None:
+        resp.headers["X-Next-Cursor"] = str(next_cursor)
+    return resp
+
+@app.route("/api/search", methods=["GET"])
+def search_translations():
+    # ?q=término&limit=&cursor=<X-Next-Cursor de la página anterior>
+    limit = max(1, min(request.args.get("limit", 20, type=int), HISTORY_MAX_LIMIT))
+    cursor = request.args.get("cursor", type=int)
+
+    items, next_cursor, capped = sqlite_cache.search(
+        request.args.get("q", ""),
+        limit=limit,
+        namespace=worker.namespace,
+        cursor=cursor
+    )
+    resp = jsonify(items)
+    if next_cursor is not None:
+        resp.headers["X-Next-Cursor"] = str(next_cursor)
+    if capped:
+        # Solo se rankean las N coincidencias más nuevas: afinar la búsqueda
+        resp.headers["X-Search-Capped"] = str(SEARCH_RANK_WINDOW)
+    return resp
+
+def apply_config(data: dict):
+    """
+    Guarda la configuración y recarga el cliente en caliente.
+    Retorna (respuesta, status); compartido por Flask y el servidor async.
+    """
 
     # ==========================
     # Leer datos
@@ -124,14 +279,14 @@ def save_config():
     # Validación básica
     # ==========================
     if not api_key:
-        return jsonify({"error": "API key vacía"}), 400
+        return {"error": "API key vacía"}, 400
 
     # 🔒 Blindaje: si viene como VAR=sk-..., extraer solo el valor
     if "=" in api_key:
         api_key = api_key.split("=", 1)[1].strip()
 
     if not api_key:
-        return jsonify({"error": "API key inválida"}), 400
+        return {"error": "API key inválida"}, 400
 
     # ==========================
     # Guardar configuración
@@ -148,38 +303,82 @@ def save_config():
     global worker
 
     try:
+        old_client = worker.deepseek
+
         deepseek = DeepSeekClient(
             api_key=api_key,
-            target_language=target_language
+            target_language=target_language,
+            hedge=HEDGE_REQUESTS
         )
+        start_client(deepseek)
 
         worker.deepseek = deepseek
 
+        # El pool anterior se cierra cuando terminan sus peticiones en curso
+        if old_client:
+            close_client(old_client)
+
         print("[Config] ✅ API key cargada en caliente")
 
     except Exception as e:
         print("[Config] ❌ Error creando DeepSeekClient:", e)
-        return jsonify({
+        return {
             "error": "API key inválida o error al inicializar cliente"
-        }), 400
+        }, 400
+
+    return {"status": "ok"}
 
-    return jsonify({"status": "ok"})
+
+@app.route("/api/config", methods=["POST"])
+def save_config():
+    body, status = apply_config(request.json or {})
+    return jsonify(body), status
 
 
 
 # ==========================
 # MAIN
 # ==========================
+def run_async_server():
+    """
+    Modo async: las mismas rutas servidas por aiohttp en el loop del
+    worker (sin hilos por request, sin saltos entre hilos).
+    """
+    from async_server import create_app, serve
+
+    app_async = create_app(
+        worker=worker,
+        cache=cache,
+        sqlite_cache=sqlite_cache,
+        speech_buffer=speech_buffer,
+        apply_config=apply_config,
+        history_max_limit=HISTORY_MAX_LIMIT
+    )
+    asyncio.run_coroutine_threadsafe(
+        serve(app_async, host="0.0.0.0", port=PORT),
+        loop
+    ).result()
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
 if __name__ == "__main__":
     threading.Thread(
         target=watcher.start,
         daemon=True
     ).start()
 
-    print(f"[Server] http://127.0.0.1:{PORT}")
-    app.run(
-        host="0.0.0.0",
-        port=PORT,
-        threaded=True,
-        debug=False
-    )
+    print(f"[Server] http://127.0.0.1:{PORT} ({SERVER_MODE})")
+
+    if SERVER_MODE == "async":
+        run_async_server()
+    else:
+        app.run(
+            host="0.0.0.0",
+            port=PORT,
+            threaded=True,
+            debug=False
+        )
@@ -1,141 +1,1224 @@
+import gzip
+import json
+import os
+import queue
 import sqlite3
 import threading
 import time
-import hashlib
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+from cache_keys import HASH_PREFIX, KEY_VERSION, make_key, migrate_key_v1
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# ==========================
+# SQL (constantes → el statement cache de sqlite3 las reutiliza)
+# ==========================
+SQL_GET = "SELECT value FROM translations WHERE ns = ? AND key = ?"
+# doc: id entero para FTS5 (la tabla es WITHOUT ROWID); MAX usa el índice único
+SQL_NEXT_DOC = "(SELECT COALESCE(MAX(doc), 0) + 1 FROM translations)"
+
+# MAX(doc) por índice (sin él, cada INSERT recorre la tabla)
+SQL_CREATE_DOC_INDEX = """
+    CREATE UNIQUE INDEX IF NOT EXISTS translations_doc
+    ON translations (doc)
+"""
+
+# UPSERT (no REPLACE) → conserva hits, created_at y doc de la fila existente
+SQL_SET = f"""
+    INSERT INTO translations (ns, key, value, created_at, accessed_at, source, doc)
+    VALUES (?, ?, ?, ?, ?, ?, {SQL_NEXT_DOC})
+    ON CONFLICT (ns, key) DO UPDATE SET
+        value = excluded.value,
+        accessed_at = excluded.accessed_at,
+        source = COALESCE(excluded.source, source)
+"""
+SQL_TOUCH = """
+    UPDATE translations
+    SET hits = hits + ?, accessed_at = ?
+    WHERE ns = ? AND key = ?
+"""
+SQL_WARM = """
+    SELECT key, value
+    FROM translations
+    WHERE ns = ?
+    ORDER BY hits DESC, accessed_at DESC
+    LIMIT ?
+"""
+
+# Historial append-only: id creciente = orden de llegada.
+# Paginación keyset (id < cursor) sobre el rowid / índice (ns, id):
+# latencia constante sin importar el tamaño de la tabla
+SQL_CREATE_HISTORY = """
+    CREATE TABLE IF NOT EXISTS history (
+        id INTEGER PRIMARY KEY,
+        ns TEXT NOT NULL,
+        key TEXT NOT NULL,
+        ts INTEGER NOT NULL
+    )
+"""
+SQL_HISTORY_ADD = "INSERT INTO history (ns, key, ts) VALUES (?, ?, ?)"
+SQL_HISTORY = """
+    SELECT h.id, h.key, t.value, h.ts
+    FROM history h
+    JOIN translations t ON t.ns = h.ns AND t.key = h.key
+    WHERE h.id < ?
+    ORDER BY h.id DESC
+    LIMIT ?
+"""
+SQL_HISTORY_NS = """
+    SELECT h.id, h.key, t.value, h.ts
+    FROM history h
+    JOIN translations t ON t.ns = h.ns AND t.key = h.key
+    WHERE h.ns = ? AND h.id < ?
+    ORDER BY h.id DESC
+    LIMIT ?
+"""
+SQL_COUNT = "SELECT COUNT(*) FROM translations"
+SQL_COUNT_NS = "SELECT COUNT(*) FROM translations WHERE ns = ?"
+
+# (ns, key) es la clave primaria de una tabla WITHOUT ROWID:
+# el lookup es una sola búsqueda en el B-tree, sin índice aparte
+SQL_CREATE_TRANSLATIONS = """
+    CREATE TABLE IF NOT EXISTS translations (
+        ns TEXT NOT NULL DEFAULT '',
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        created_at INTEGER,
+        hits INTEGER NOT NULL DEFAULT 0,
+        accessed_at INTEGER,
+        source TEXT,
+        doc INTEGER,
+        PRIMARY KEY (ns, key)
+    ) WITHOUT ROWID
+"""
+
+# ==========================
+# BÚSQUEDA (FTS5, external content sobre translations.doc)
+# ==========================
+# trigram: substrings en cualquier idioma (japonés sin espacios incluido);
+# unicode61 si el SQLite no lo trae
+SQL_CREATE_FTS = """
+    CREATE VIRTUAL TABLE translations_fts USING fts5(
+        source, value,
+        content='translations', content_rowid='doc',
+        tokenize='{tokenizer}'
+    )
+"""
+# Triggers: el índice sigue a translations (touch no toca source/value → no dispara).
+# decode_value (función registrada en cada conexión) → se indexa el texto,
+# no el BLOB comprimido
+SQL_CREATE_FTS_TRIGGERS = (
+    "DROP TRIGGER IF EXISTS translations_fts_ai",
+    "DROP TRIGGER IF EXISTS translations_fts_ad",
+    "DROP TRIGGER IF EXISTS translations_fts_au",
+    """
+    CREATE TRIGGER translations_fts_ai AFTER INSERT ON translations BEGIN
+        INSERT INTO translations_fts (rowid, source, value)
+        VALUES (new.doc, new.source, decode_value(new.value));
+    END
+    """,
+    """
+    CREATE TRIGGER translations_fts_ad AFTER DELETE ON translations BEGIN
+        INSERT INTO translations_fts (translations_fts, rowid, source, value)
+        VALUES ('delete', old.doc, old.source, decode_value(old.value));
+    END
+    """,
+    """
+    CREATE TRIGGER translations_fts_au
+    AFTER UPDATE OF source, value, doc ON translations BEGIN
+        INSERT INTO translations_fts (translations_fts, rowid, source, value)
+        VALUES ('delete', old.doc, old.source, decode_value(old.value));
+        INSERT INTO translations_fts (rowid, source, value)
+        VALUES (new.doc, new.source, decode_value(new.value));
+    END
+    """,
+)
+# Ranking acotado: bm25 solo sobre las SEARCH_RANK_WINDOW coincidencias más
+# nuevas DEL NAMESPACE (rango de rowid → FTS5 no puntúa las 100k filas de un
+# término común; otros idiomas en la misma base no empujan fuera las propias)
+SEARCH_RANK_WINDOW = 1000
+SQL_SEARCH_WINDOW = f"""
+    SELECT translations_fts.rowid AS doc FROM translations_fts
+    JOIN translations wt ON wt.doc = translations_fts.rowid
+    WHERE translations_fts MATCH :q AND (:ns IS NULL OR wt.ns = :ns)
+    ORDER BY translations_fts.rowid DESC
+    LIMIT {SEARCH_RANK_WINDOW}
+"""
+SQL_SEARCH = f"""
+    SELECT t.key, t.source, t.value, t.created_at, f.rank
+    FROM translations_fts f
+    JOIN translations t ON t.doc = f.rowid
+    WHERE translations_fts MATCH :q
+      AND f.rowid >= (SELECT COALESCE(MIN(doc), 0) FROM ({SQL_SEARCH_WINDOW}))
+      AND (:ns IS NULL OR t.ns = :ns)
+    ORDER BY f.rank
+    LIMIT :limit OFFSET :offset
+"""
+# Ventana llena → hay coincidencias más viejas que la búsqueda no alcanza
+SQL_SEARCH_WINDOW_COUNT = f"SELECT COUNT(*) FROM ({SQL_SEARCH_WINDOW})"
+# Términos < 3 caracteres (p.ej. nombres japoneses de 2): trigram no los indexa
+SQL_SEARCH_SHORT = """
+    SELECT key, source, value, created_at, NULL
+    FROM translations
+    WHERE (source LIKE ? OR decode_value(value) LIKE ?) AND (? IS NULL OR ns = ?)
+    ORDER BY created_at DESC
+    LIMIT ? OFFSET ?
+"""
+
+# Packs de solo lectura (ATTACH ... AS packN): misma tabla, otro schema
+SQL_GET_PACK = "SELECT value FROM {schema}.translations WHERE ns = ? AND key = ?"
+SQL_KEYS_PACK = "SELECT ns, key FROM {schema}.translations"
+
+# Import: las filas propias ganan salvo overwrite=True
+SQL_IMPORT = f"""
+    INSERT INTO translations (ns, key, value, created_at, source, doc)
+    VALUES (?, ?, ?, ?, ?, {SQL_NEXT_DOC})
+    ON CONFLICT (ns, key) DO NOTHING
+"""
+SQL_IMPORT_OVERWRITE = f"""
+    INSERT INTO translations (ns, key, value, created_at, source, doc)
+    VALUES (?, ?, ?, ?, ?, {SQL_NEXT_DOC})
+    ON CONFLICT (ns, key) DO UPDATE SET
+        value = excluded.value,
+        created_at = excluded.created_at,
+        source = COALESCE(excluded.source, source)
+"""
+SQL_EXPORT = "SELECT ns, key, value, created_at, source FROM translations"
+SQL_EXPORT_NS = "SELECT ns, key, value, created_at, source FROM translations WHERE ns = ?"
+
+# ==========================
+# MANTENIMIENTO (presupuesto / eviction / vacuum)
+# ==========================
+# Víctimas: LRU = acceso más viejo primero (NULL = nunca usada desde la migración)
+SQL_EVICT = {
+    "lru": "SELECT ns, key FROM translations ORDER BY accessed_at, hits LIMIT ?",
+    "lfu": "SELECT ns, key FROM translations ORDER BY hits, accessed_at LIMIT ?",
+}
+SQL_DELETE = "DELETE FROM translations WHERE ns = ? AND key = ?"
+SQL_TRIM_HISTORY = "DELETE FROM history WHERE id <= (SELECT MAX(id) FROM history) - ?"
+
+EVICT_TARGET = 0.9     # al pasarse del presupuesto se baja al 90%
+EVICT_CHUNK = 1000     # filas por transacción (el writer no queda tomado)
+VACUUM_PAGES = 2000    # páginas liberadas por pasada de incremental_vacuum
+
+# Columnas añadidas después del esquema (ns, key): nombre → DDL
+TRANSLATIONS_EXTRA_COLUMNS = {
+    "hits": "INTEGER NOT NULL DEFAULT 0",
+    "accessed_at": "INTEGER",
+    "source": "TEXT",
+    "doc": "INTEGER",
+}
 
 
 class SQLiteTranslationStore:
-    def __init__(self, db_path="translations.db"):
+    """
+    Cache persistente en SQLite.
+
+    - Conexiones de larga vida (1 writer + pool de lectores)
+    - WAL: lectores concurrentes sin bloquear al writer
+    - Solo las escrituras se serializan con self.lock
+    - Entradas separadas por namespace (idioma | modelo | prompt),
+      ver cache_keys.make_namespace
+
+    write_behind=True:
+    - set() solo encola en RAM; un hilo writer hace flush por lotes
+      (1 transacción / 1 fsync por lote) cada flush_interval segundos
+      o al llegar a flush_batch pendientes
+    - get() ve las escrituras pendientes
+    - close() hace flush final
+
+    Frecuencia de acceso (hits / accessed_at):
+    - get() con hit y touch() acumulan en RAM; el mismo hilo writer
+      las escribe por lotes (sin escritura por lectura)
+    - iter_warm() entrega las más usadas para precalentar la RAM
+
+    Historial (overlay):
+    - set() agrega una fila a history (append-only, mismo lote que la traducción)
+    - get_history() pagina por cursor (id), sin sort ni full scan
+
+    Búsqueda:
+    - source guarda el texto original (las claves largas son solo hash)
+    - translations_fts (FTS5) indexa source + value, sincronizado por triggers
+    - search() → resultados por relevancia (bm25), paginados
+
+    Packs (caches precalculadas, p.ej. por juego):
+    - attach_pack() agrega una base de solo lectura detrás del store
+    - precedencia: store escribible → packs en orden de attach
+    - export_pack() / import_pack(): JSONL (.gz opcional) o .db, en streaming
+
+    Mantenimiento (hilo cada maintenance_interval segundos):
+    - presupuesto max_rows / max_bytes → eviction lru | lfu (hits / accessed_at)
+    - history acotado a history_max filas
+    - incremental vacuum (devuelve al disco las páginas liberadas)
+    - compress="zlib" | "zstd": valores ≥ compress_min bytes se guardan comprimidos
+    - disk_stats() → tamaño en disco para /api/cache/stats
+    """
+
+    def __init__(
+        self,
+        db_path="translations.db",
+        pool_size=4,
+        write_behind=False,
+        flush_interval=0.5,
+        flush_batch=64,
+        max_rows=None,
+        max_bytes=None,
+        evict_policy="lru",
+        compress=None,
+        compress_min=512,
+        history_max=50000,
+        maintenance_interval=300
+    ):
+        if evict_policy not in SQL_EVICT:
+            raise ValueError(f"Política de eviction desconocida: {evict_policy}")
+        if compress == "zstd" and zstandard is None:
+            print("[SQLite] ⚠ zstandard no instalado → compresión zlib")
+            compress = "zlib"
+
         self.db_path = db_path
+        self.pool_size = pool_size
         self.lock = threading.Lock()
+
+        # Presupuesto / compresión
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.evict_policy = evict_policy
+        self.compress = compress
+        self.compress_min = compress_min
+        self.history_max = history_max
+        self._evicted = 0
+        self._last_maintenance = None
+
+        self._readers = queue.LifoQueue(maxsize=pool_size)
+        self._closed = False
+
+        # Packs de solo lectura; cada lector los adjunta al conectarse
+        self._packs = []
+        self._pack_sql = []
+        self._pack_gen = 0
+
+        self._writer = self._connect()
         self._init_db()
 
+        # Write-behind
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        self._pending_lock = threading.Lock()
+        self._pending = {}    # (ns, key) -> (value, ts) aún no escritos
+        self._flushing = {}   # lote en escritura (visible para get)
+        self._access = {}     # (ns, key) -> [hits, último acceso]
+        self._history = []    # (ns, key, ts) aún no escritos
+        self._flush_wakeup = threading.Event()
+
+        # Writer en background: pendientes (write-behind) + estadísticas de acceso
+        self._flusher = threading.Thread(
+            target=self._flush_loop,
+            name="sqlite-write-behind",
+            daemon=True
+        )
+        self._flusher.start()
+
+        self.maintenance_interval = maintenance_interval
+        self._maintenance_wakeup = threading.Event()
+        self._maintainer = None
+        if maintenance_interval:
+            self._maintainer = threading.Thread(
+                target=self._maintenance_loop,
+                name="sqlite-maintenance",
+                daemon=True
+            )
+            self._maintainer.start()
+
+    # ==========================
+    # CONEXIONES
+    # ==========================
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=10,
+            check_same_thread=False,
+            cached_statements=64,
+            uri=True  # ATTACH de packs con ?mode=ro
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.create_function("decode_value", 1, decode_value, deterministic=True)
+        return conn
+
+    def _connect_reader(self):
+        conn = self._connect()
+        for i, path in enumerate(self._packs):
+            uri = Path(path).resolve().as_uri() + "?mode=ro"
+            conn.execute(f"ATTACH DATABASE ? AS pack{i}", (uri,))
+        return conn
+
+    @contextmanager
+    def _reader(self):
+        """
+        Presta una conexión de lectura del pool.
+        Si el pool está vacío se abre otra; si al devolverla
+        el pool está lleno, se cierra (pool acotado).
+        Conexiones de antes del último attach_pack() se reemplazan.
+        """
+        gen = self._pack_gen
+        try:
+            conn, conn_gen = self._readers.get_nowait()
+            if conn_gen != gen:
+                conn.close()
+                conn = self._connect_reader()
+        except queue.Empty:
+            conn = self._connect_reader()
+
+        try:
+            yield conn
+        finally:
+            if self._closed or gen != self._pack_gen:
+                conn.close()
+            else:
+                try:
+                    self._readers.put_nowait((conn, gen))
+                except queue.Full:
+                    conn.close()
+
+    def close(self):
+        """Flush final + cierra writer y lectores (llamar al apagar)."""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._maintainer:
+            self._maintenance_wakeup.set()
+            self._maintainer.join()
+        if self._flusher:
+            self._flush_wakeup.set()
+            self._flusher.join()
+        self.flush()
+
+        while True:
+            try:
+                self._readers.get_nowait()[0].close()
+            except queue.Empty:
+                break
+
+        with self.lock:
+            self._writer.close()
+
     # ==========================
     # INIT
     # ==========================
     def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS translations (
-                    key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL,
-                    created_at INTEGER
+        with self.lock:
+            # Base nueva: incremental vacuum desde el inicio (solo antes de crear tablas)
+            if not self._columns("translations") and not self._columns("meta"):
+                self._writer.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                self._writer.execute("VACUUM")  # WAL ya escribió el header
+
+            self._writer.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    name TEXT PRIMARY KEY,
+                    value TEXT
                 )
             """)
-            conn.commit()
 
-    # ==========================
-    # UTIL
-    # ==========================
-    def _normalize_key(self, text: str) -> str:
+            columns = self._columns("translations")
+            if columns and "ns" not in columns:
+                self._migrate_namespaces()
+            else:
+                self._writer.execute(SQL_CREATE_TRANSLATIONS)
+
+            columns = self._columns("translations")
+            for name, ddl in TRANSLATIONS_EXTRA_COLUMNS.items():
+                if name not in columns:
+                    self._writer.execute(f"ALTER TABLE translations ADD COLUMN {name} {ddl}")
+
+            # Warm-up: más usadas primero, sin sort
+            self._writer.execute("""
+                CREATE INDEX IF NOT EXISTS translations_hits
+                ON translations (ns, hits DESC, accessed_at DESC)
+            """)
+            self._writer.execute(SQL_CREATE_DOC_INDEX)
+            self._writer.commit()
+
+            self._migrate_keys()
+
+            # Después de migrar claves: el historial inicial ya usa las nuevas
+            if "id" not in self._columns("history"):
+                with self._writer:
+                    self._create_history()
+
+            with self._writer:
+                if not self._columns("translations_fts"):
+                    self._create_fts()
+                for ddl in SQL_CREATE_FTS_TRIGGERS:
+                    self._writer.execute(ddl)
+
+    def _columns(self, table):
+        return {
+            row[1]
+            for row in self._writer.execute(f"PRAGMA table_info({table})")
+        }
+
+    def _create_history(self):
+        """Tabla history nueva: se siembra con las filas existentes por created_at."""
+        self._writer.execute(SQL_CREATE_HISTORY)
+        self._writer.execute("""
+            CREATE INDEX IF NOT EXISTS history_ns ON history (ns, id)
+        """)
+        cur = self._writer.execute("""
+            INSERT INTO history (ns, key, ts)
+            SELECT ns, key, COALESCE(created_at, 0)
+            FROM translations
+            ORDER BY created_at
+        """)
+        if cur.rowcount:
+            print(f"[SQLite] Historial inicial: {cur.rowcount} filas")
+
+    def _create_fts(self):
         """
-        Normaliza texto para matching estable entre sesiones
-        (alineado con TranslationCache RAM)
+        Índice FTS5 nuevo: asigna doc a las filas existentes, rellena
+        source con la clave cuando es texto (no hash) y construye el índice.
         """
-        # --------------------------
-        # Normalización base (existente)
-        # --------------------------
-        normalized = ' '.join(text.strip().split())
+        rows = self._writer.execute(
+            "SELECT ns, key, source FROM translations WHERE doc IS NULL"
+        ).fetchall()
+        start = self._writer.execute(
+            "SELECT COALESCE(MAX(doc), 0) FROM translations"
+        ).fetchone()[0]
 
-        # --------------------------
-        # ➕ EXTENSIÓN MULTI-IDIOMA
-        # (NO elimina nada existente)
-        # --------------------------
+        self._writer.executemany(
+            "UPDATE translations SET doc = ?, source = ? WHERE ns = ? AND key = ?",
+            (
+                (start + i, source or _source_from_key(key), ns, key)
+                for i, (ns, key, source) in enumerate(rows, 1)
+            )
+        )
 
-        # Normalizar puntos suspensivos
-        normalized = normalized.replace('…', '...')
+        try:
+            self._writer.execute(SQL_CREATE_FTS.format(tokenizer="trigram"))
+        except sqlite3.OperationalError:
+            self._writer.execute(SQL_CREATE_FTS.format(tokenizer="unicode61"))
 
-        # Normalizar comillas comunes y japonesas
-        QUOTE_MAP = {
-            '“': '"',
-            '”': '"',
-            '„': '"',
-            '«': '"',
-            '»': '"',
-            '‘': "'",
-            '’': "'",
-            '‚': "'",
-            '『': '「',
-            '』': '」',
-        }
+        # (no 'rebuild': leería los BLOB comprimidos tal cual)
+        self._writer.execute("""
+            INSERT INTO translations_fts (rowid, source, value)
+            SELECT doc, source, decode_value(value) FROM translations
+        """)
+
+        if rows:
+            print(f"[SQLite] Índice de búsqueda (FTS5): {len(rows)} filas")
 
-        for src, dst in QUOTE_MAP.items():
-            normalized = normalized.replace(src, dst)
+    def _migrate_namespaces(self):
+        """
+        Esquema v1 (key PRIMARY KEY) → (ns, key) WITHOUT ROWID.
+        Las filas existentes quedan en ns='' hasta claim_legacy().
+        """
+        with self._writer:
+            self._writer.execute("ALTER TABLE translations RENAME TO translations_v1")
+            self._writer.execute(SQL_CREATE_TRANSLATIONS)
+            self._writer.execute("""
+                INSERT OR REPLACE INTO translations (ns, key, value, created_at)
+                SELECT '', key, value, created_at FROM translations_v1
+            """)
+            self._writer.execute("DROP TABLE translations_v1")
 
-        # --------------------------
-        # Hash para textos largos
-        # --------------------------
+        print("[SQLite] Esquema migrado → namespaces (ns, key)")
 
-        # textos largos → hash
-        if len(normalized) > 200:
-            return hashlib.md5(normalized.encode()).hexdigest()
+    def claim_legacy(self, namespace: str, legacy: str = ""):
+        """
+        Asigna las filas del namespace `legacy` (por defecto '', pre-migración)
+        al namespace dado, normalmente el de la configuración actual.
+        """
+        if not namespace or namespace == legacy:
+            return 0
+
+        with self.lock, self._writer:
+            cur = self._writer.execute(
+                "UPDATE OR IGNORE translations SET ns = ? WHERE ns = ?",
+                (namespace, legacy)
+            )
+            self._writer.execute(
+                "UPDATE history SET ns = ? WHERE ns = ?",
+                (namespace, legacy)
+            )
+            if cur.rowcount:
+                print(f"[SQLite] {cur.rowcount} traducciones previas → ns '{namespace}'")
+            return cur.rowcount
+
+    def _migrate_keys(self):
+        """
+        Reescribe las claves al formato KEY_VERSION (cache_keys)
+        para no perder hit rate al cambiar la normalización.
+        Las claves v1 hasheadas (md5) no se pueden recalcular y se dejan.
+        """
+        row = self._writer.execute(
+            "SELECT value FROM meta WHERE name = 'key_version'"
+        ).fetchone()
+        version = int(row[0]) if row else 1
+
+        if version >= KEY_VERSION:
+            return
+
+        updates = []
+        for ns, old_key in self._writer.execute("SELECT ns, key FROM translations"):
+            new_key = migrate_key_v1(old_key)
+            if new_key is not None and new_key != old_key:
+                updates.append((new_key, ns, old_key))
+
+        with self._writer:
+            # OR REPLACE: si dos claves v1 colapsan en la misma, queda una
+            self._writer.executemany(
+                "UPDATE OR REPLACE translations SET key = ? WHERE ns = ? AND key = ?",
+                updates
+            )
+            self._writer.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('key_version', ?)",
+                (str(KEY_VERSION),)
+            )
 
-        return normalized
+        if updates:
+            print(f"[SQLite] Claves migradas v{version} → v{KEY_VERSION}: {len(updates)}")
 
     # ==========================
     # GET (cache exacto)
     # ==========================
-    def get(self, text: str):
-        key = self._normalize_key(text)
+    def get(self, text: str, namespace: str = ""):
+        key = (namespace, make_key(text))
 
-        with self.lock, sqlite3.connect(self.db_path) as conn:
-            cur = conn.execute(
-                "SELECT value FROM translations WHERE key = ?",
-                (key,)
-            )
-            row = cur.fetchone()
-            return row[0] if row else None
+        if self.write_behind:
+            with self._pending_lock:
+                hit = self._pending.get(key) or self._flushing.get(key)
+            if hit:
+                self._record_access(key)
+                return hit[0]
+
+        with self._reader() as conn:
+            row = conn.execute(SQL_GET, key).fetchone()
+            if row is None:
+                return self._get_pack(conn, key)
+
+        self._record_access(key)
+        return decode_value(row[0])
+
+    def _get_pack(self, conn, key):
+        """Packs en orden de precedencia (sin estadísticas: son de solo lectura)."""
+        for sql in self._pack_sql:
+            row = conn.execute(sql, key).fetchone()
+            if row:
+                return decode_value(row[0])
+        return None
+
+    # ==========================
+    # FRECUENCIA DE ACCESO
+    # ==========================
+    def _record_access(self, key):
+        now = int(time.time())
+        with self._pending_lock:
+            stats = self._access.get(key)
+            if stats:
+                stats[0] += 1
+                stats[1] = now
+            else:
+                self._access[key] = [1, now]
+
+    def touch(self, text: str, namespace: str = ""):
+        """Registra un acceso servido por otro tier (p.ej. hit en RAM)."""
+        self._record_access((namespace, make_key(text)))
+
+    def iter_warm(self, namespace: str = "", limit: int = 500):
+        """
+        Stream (key, value) de las entradas más usadas del namespace,
+        en una sola consulta (índice translations_hits).
+        """
+        self.flush()
+
+        with self._reader() as conn:
+            for key, value in conn.execute(SQL_WARM, (namespace, limit)):
+                yield key, decode_value(value)
+
+    def get_key(self, key: str, namespace: str = ""):
+        """Lookup por clave ya normalizada (p.ej. resultado del FuzzyIndex)."""
+        with self._reader() as conn:
+            row = conn.execute(SQL_GET, (namespace, key)).fetchone()
+            if row is None:
+                return self._get_pack(conn, (namespace, key))
+            return decode_value(row[0])
+
+    def iter_keys(self):
+        """Stream de (ns, key) de todas las filas (para construir índices)."""
+        if self.write_behind:
+            self.flush()
+
+        with self._reader() as conn:
+            yield from conn.execute("SELECT ns, key FROM translations")
+            for i in range(len(self._packs)):
+                yield from conn.execute(SQL_KEYS_PACK.format(schema=f"pack{i}"))
 
     # ==========================
     # SET
     # ==========================
-    def set(self, text: str, value: str):
-        key = self._normalize_key(text)
+    def set(self, text: str, value: str, namespace: str = "", history: bool = True):
+        """history=False → solo cache (p.ej. segmentos de un bloque ya registrado)."""
+        key = (namespace, make_key(text))
         ts = int(time.time())
 
-        with self.lock, sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                INSERT OR REPLACE INTO translations (key, value, created_at)
-                VALUES (?, ?, ?)
-                """,
-                (key, value, ts)
+        if self.write_behind:
+            with self._pending_lock:
+                self._pending[key] = (value, ts, text.strip())
+                if history:
+                    self._history.append((*key, ts))
+                full = len(self._pending) >= self.flush_batch
+            if full:
+                self._flush_wakeup.set()
+            return
+
+        with self.lock:
+            self._writer.execute(
+                SQL_SET, (*key, self._encode(value), ts, ts, text.strip())
             )
-            conn.commit()
+            if history:
+                self._writer.execute(SQL_HISTORY_ADD, (*key, ts))
+            self._writer.commit()
+
+    # ==========================
+    # WRITE-BEHIND (group commit)
+    # ==========================
+    def _flush_loop(self):
+        while not self._closed:
+            self._flush_wakeup.wait(self.flush_interval)
+            self._flush_wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[SQLite] Error en flush: {e}")
+
+    def flush(self):
+        """
+        Escribe las traducciones pendientes y las estadísticas
+        de acceso en una sola transacción.
+        """
+        with self.lock:
+            with self._pending_lock:
+                if not self._pending and not self._access:
+                    return 0
+                batch = self._pending
+                access = self._access
+                history = self._history
+                self._pending = {}
+                self._access = {}
+                self._history = []
+                self._flushing = batch
+
+            try:
+                with self._writer:
+                    self._writer.executemany(
+                        SQL_SET,
+                        [
+                            (ns, key, self._encode(value), ts, ts, source)
+                            for (ns, key), (value, ts, source) in batch.items()
+                        ]
+                    )
+                    self._writer.executemany(
+                        SQL_TOUCH,
+                        [(n, ts, ns, key) for (ns, key), (n, ts) in access.items()]
+                    )
+                    self._writer.executemany(SQL_HISTORY_ADD, history)
+            except Exception:
+                # Reencolar lo que no fue sobrescrito mientras tanto
+                with self._pending_lock:
+                    for key, item in batch.items():
+                        self._pending.setdefault(key, item)
+                    self._history[:0] = history
+                raise
+            finally:
+                with self._pending_lock:
+                    self._flushing = {}
+
+        return len(batch)
 
     # ==========================
     # HISTORIAL (para overlay)
     # ==========================
-    def get_last(self, limit=20):
+    def get_history(self, limit=20, namespace=None, cursor=None):
+        """
+        Página del historial, más reciente primero.
+        cursor: "next_cursor" de la página anterior (None = desde el final).
+        Retorna (items, next_cursor); next_cursor None = no hay más.
+        namespace=None → todos los namespaces.
+        """
+        if limit < 1:
+            raise ValueError("limit debe ser ≥ 1")
+
+        if self.write_behind:
+            self.flush()
+
+        before = cursor if cursor is not None else 2 ** 63 - 1
+
+        with self._reader() as conn:
+            if namespace is None:
+                rows = conn.execute(SQL_HISTORY, (before, limit)).fetchall()
+            else:
+                rows = conn.execute(SQL_HISTORY_NS, (namespace, before, limit)).fetchall()
+
+        items = [
+            {
+                "id": row_id,
+                "key": key,
+                "value": decode_value(value),
+                "created_at": ts
+            }
+            for row_id, key, value, ts in rows
+        ]
+        next_cursor = items[-1]["id"] if len(items) == limit else None
+        return items, next_cursor
+
+    def get_last(self, limit=20, namespace=None):
         """
         Devuelve las últimas traducciones en orden descendente.
         Uso: historial visual / overlay.
+        namespace=None → todos los namespaces.
         """
-        with self.lock, sqlite3.connect(self.db_path) as conn:
-            cur = conn.execute(
-                """
-                SELECT key, value, created_at
-                FROM translations
-                ORDER BY created_at DESC
-                LIMIT ?
-                """,
-                (limit,)
-            )
-            rows = cur.fetchall()
+        return self.get_history(limit, namespace)[0]
 
-        return [
+    # ==========================
+    # BÚSQUEDA (overlay / herramientas)
+    # ==========================
+    def search(self, query: str, limit=20, namespace=None, cursor=None):
+        """
+        Busca en texto original y traducción, más relevante primero
+        (entre las SEARCH_RANK_WINDOW coincidencias más recientes del namespace).
+        cursor: "next_cursor" de la página anterior (offset).
+        Retorna (items, next_cursor, capped); next_cursor None = no hay más;
+        capped=True → la ventana se llenó (hay coincidencias más viejas
+        fuera de alcance: afinar la búsqueda).
+        """
+        if limit < 1:
+            raise ValueError("limit debe ser ≥ 1")
+
+        terms = query.split()
+        if not terms:
+            return [], None, False
+
+        if self.write_behind:
+            self.flush()
+
+        offset = cursor or 0
+
+        with self._reader() as conn:
+            if min(len(t) for t in terms) < 3:
+                # trigram necesita ≥ 3 caracteres → LIKE (scan, solo términos cortos)
+                like = "%" + query.strip().replace("%", "").replace("_", "") + "%"
+                rows = conn.execute(
+                    SQL_SEARCH_SHORT,
+                    (like, like, namespace, namespace, limit, offset)
+                ).fetchall()
+                capped = False
+            else:
+                params = {
+                    "q": _fts_query(query),
+                    "ns": namespace,
+                    "limit": limit,
+                    "offset": offset,
+                }
+                rows = conn.execute(SQL_SEARCH, params).fetchall()
+                window = conn.execute(SQL_SEARCH_WINDOW_COUNT, params).fetchone()[0]
+                capped = window >= SEARCH_RANK_WINDOW
+
+        items = [
             {
                 "key": key,
-                "value": value,
-                "created_at": created_at
+                "source": source,
+                "value": decode_value(value),
+                "created_at": created_at,
+                "score": round(-rank, 3) if rank is not None else None
             }
-            for key, value, created_at in rows
+            for key, source, value, created_at, rank in rows
         ]
+        next_cursor = offset + limit if len(items) == limit else None
+        return items, next_cursor, capped
 
     # ==========================
     # STATS
     # ==========================
-    def count(self):
-        with self.lock, sqlite3.connect(self.db_path) as conn:
-            cur = conn.execute("SELECT COUNT(*) FROM translations")
-            return cur.fetchone()[0]
+    def count(self, namespace=None):
+        if self.write_behind:
+            self.flush()
+
+        with self._reader() as conn:
+            if namespace is None:
+                return conn.execute(SQL_COUNT).fetchone()[0]
+            return conn.execute(SQL_COUNT_NS, (namespace,)).fetchone()[0]
+
+    def disk_stats(self):
+        """Tamaño en disco + presupuesto (para /api/cache/stats)."""
+        with self._reader() as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            pages = conn.execute("PRAGMA page_count").fetchone()[0]
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+        wal_path = f"{self.db_path}-wal"
+        return {
+            "rows": self.count(),
+            "file_bytes": _file_size(self.db_path),
+            "wal_bytes": _file_size(wal_path),
+            "used_bytes": (pages - free) * page_size,
+            "free_bytes": free * page_size,
+            "max_rows": self.max_rows,
+            "max_bytes": self.max_bytes,
+            "evict_policy": self.evict_policy,
+            "evicted": self._evicted,
+            "compress": self.compress,
+            "packs": len(self._packs),
+            "last_maintenance": self._last_maintenance,
+        }
+
+    # ==========================
+    # MANTENIMIENTO
+    # ==========================
+    def _encode(self, value: str):
+        return encode_value(value, self.compress, self.compress_min)
+
+    def _maintenance_loop(self):
+        while not self._closed:
+            self._maintenance_wakeup.wait(self.maintenance_interval)
+            if self._closed:
+                break
+            try:
+                self.maintain()
+            except Exception as e:
+                print(f"[SQLite] Error en mantenimiento: {e}")
+
+    def maintain(self):
+        """
+        Una pasada: presupuesto → eviction, historial acotado,
+        incremental vacuum. Retorna las filas evictadas.
+        """
+        evicted = self._evict()
+
+        if self.history_max:
+            with self.lock, self._writer:
+                self._writer.execute(SQL_TRIM_HISTORY, (self.history_max,))
+
+        self._vacuum()
+        self._last_maintenance = int(time.time())
+        return evicted
+
+    def _evict(self):
+        if not self.max_rows and not self.max_bytes:
+            return 0
+
+        rows = self.count()
+        excess = 0
+
+        if self.max_rows and rows > self.max_rows:
+            excess = rows - int(self.max_rows * EVICT_TARGET)
+
+        if self.max_bytes and rows:
+            used = self.disk_stats()["used_bytes"]
+            if used > self.max_bytes:
+                per_row = used / rows
+                excess = max(excess, int((used - self.max_bytes * EVICT_TARGET) / per_row))
+
+        if excess <= 0:
+            return 0
+
+        with self._reader() as conn:
+            victims = conn.execute(SQL_EVICT[self.evict_policy], (excess,)).fetchall()
+
+        for i in range(0, len(victims), EVICT_CHUNK):
+            with self.lock, self._writer:
+                self._writer.executemany(SQL_DELETE, victims[i:i + EVICT_CHUNK])
+
+        self._evicted += len(victims)
+        print(f"[SQLite] 🧹 Eviction {self.evict_policy}: {len(victims)} filas ({rows} → {rows - len(victims)})")
+        return len(victims)
+
+    def _vacuum(self):
+        """
+        auto_vacuum=INCREMENTAL: libera hasta VACUUM_PAGES páginas por pasada.
+        Bases creadas antes (auto_vacuum=NONE) se convierten con un VACUUM
+        completo, solo si hay bastante espacio libre que recuperar.
+        """
+        with self.lock:
+            mode = self._writer.execute("PRAGMA auto_vacuum").fetchone()[0]
+            pages = self._writer.execute("PRAGMA page_count").fetchone()[0]
+            free = self._writer.execute("PRAGMA freelist_count").fetchone()[0]
+
+            if not free:
+                return
+
+            if mode == 2:
+                # executescript: execute() solo avanza un paso (= 1 página)
+                self._writer.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+            elif free > pages * 0.25:
+                print(f"[SQLite] VACUUM completo (→ incremental): {free}/{pages} páginas libres")
+                self._writer.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                self._writer.execute("VACUUM")
+            else:
+                return
+
+            # El WAL también vuelve a su tamaño mínimo
+            self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    def compact(self):
+        """
+        Compacta una base existente: comprime los valores largos guardados
+        antes de activar compress y hace un VACUUM completo (→ incremental).
+        Bloquea escrituras mientras corre; pensado para la CLI.
+        """
+        if self.write_behind:
+            self.flush()
+
+        updated = 0
+        if self.compress:
+            with self._reader() as conn:
+                cur = conn.execute(
+                    "SELECT value, ns, key FROM translations "
+                    "WHERE typeof(value) = 'text' AND length(value) >= ?",
+                    (self.compress_min,)
+                )
+                while True:
+                    chunk = cur.fetchmany(EVICT_CHUNK)
+                    if not chunk:
+                        break
+                    with self.lock, self._writer:
+                        self._writer.executemany(
+                            "UPDATE translations SET value = ? WHERE ns = ? AND key = ?",
+                            [(self._encode(value), ns, key) for value, ns, key in chunk]
+                        )
+                    updated += len(chunk)
+
+        before = _file_size(self.db_path)
+        with self.lock:
+            self._writer.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._writer.execute("VACUUM")
+            self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+        print(
+            f"[SQLite] Compactado: {updated} valores comprimidos, "
+            f"{before // 1024} KB → {_file_size(self.db_path) // 1024} KB"
+        )
+        return updated
+
+    # ==========================
+    # PACKS (solo lectura / import / export)
+    # ==========================
+    def attach_pack(self, path):
+        """
+        Agrega una base de solo lectura detrás del store.
+        Debe tener el esquema actual (ns, key); las de esquema v1
+        se incorporan con import_pack().
+        """
+        conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(translations)")}
+            count = conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0] \
+                if columns else 0
+        finally:
+            conn.close()
+
+        if "ns" not in columns:
+            raise ValueError(f"{path}: no es un pack (falta translations.ns)")
+
+        with self.lock:
+            schema = f"pack{len(self._packs)}"
+            self._packs.append(str(path))
+            self._pack_sql.append(SQL_GET_PACK.format(schema=schema))
+            self._pack_gen += 1  # lectores existentes se reconectan
+
+        print(f"[SQLite] 📦 Pack adjunto ({schema}): {path} ({count} filas)")
+        return count
+
+    def export_pack(self, path, namespace=None):
+        """
+        Exporta las traducciones (todas o de un namespace), fila por fila.
+        .db → base con el esquema actual (lista para attach_pack)
+        otro → JSONL (gzip si termina en .gz)
+        """
+        if self.write_behind:
+            self.flush()
+
+        sql, params = (SQL_EXPORT, ()) if namespace is None else (SQL_EXPORT_NS, (namespace,))
+
+        with self._reader() as conn:
+            rows = (
+                (ns, key, decode_value(value), created_at, source)
+                for ns, key, value, created_at, source in conn.execute(sql, params)
+            )
+
+            if str(path).endswith(".db"):
+                dst = sqlite3.connect(path)
+                try:
+                    dst.execute("PRAGMA journal_mode=DELETE")  # un solo archivo
+                    dst.execute(SQL_CREATE_TRANSLATIONS)
+                    dst.execute(SQL_CREATE_DOC_INDEX)
+                    with dst:
+                        cur = dst.executemany(SQL_IMPORT_OVERWRITE, rows)
+                    count = cur.rowcount
+                finally:
+                    dst.close()
+            else:
+                count = 0
+                with _open_text(path, "w") as f:
+                    for ns, key, value, created_at, source in rows:
+                        f.write(json.dumps(
+                            {
+                                "ns": ns,
+                                "key": key,
+                                "value": value,
+                                "created_at": created_at,
+                                "source": source,
+                            },
+                            ensure_ascii=False
+                        ) + "\n")
+                        count += 1
+
+        print(f"[SQLite] 📤 Pack exportado: {path} ({count} filas)")
+        return count
+
+    def import_pack(self, path, namespace=None, overwrite=False):
+        """
+        Importa un pack (.db de cualquier versión o JSONL) en una sola
+        transacción con executemany (las filas se leen en streaming).
+        namespace: reasigna todas las filas (obligatorio en la práctica
+        para bases v1, que no tienen ns).
+        overwrite=False → las traducciones propias ganan.
+        """
+        if self.write_behind:
+            self.flush()
+
+        rows = (
+            (ns, key, self._encode(value), created_at, source)
+            for ns, key, value, created_at, source in _iter_pack_rows(path, namespace)
+        )
+        sql = SQL_IMPORT_OVERWRITE if overwrite else SQL_IMPORT
+
+        with self.lock, self._writer:
+            cur = self._writer.executemany(sql, rows)
+
+        print(f"[SQLite] 📥 Pack importado: {path} ({cur.rowcount} filas nuevas/actualizadas)")
+        return cur.rowcount
+
+
+# ==========================
+# COMPRESIÓN DE VALORES
+# ==========================
+# Valores largos → BLOB con 1 byte de formato; los TEXT se leen tal cual
+_CODEC_ZLIB = b"z"
+_CODEC_ZSTD = b"s"
+
+
+def encode_value(value: str, codec=None, min_size=512):
+    """str → str (sin compresión / corto) o BLOB comprimido."""
+    if not codec:
+        return value
+
+    data = value.encode("utf-8")
+    if len(data) < min_size:
+        return value
+
+    if codec == "zstd":
+        packed = _CODEC_ZSTD + zstandard.ZstdCompressor(level=3).compress(data)
+    else:
+        packed = _CODEC_ZLIB + zlib.compress(data, 6)
+
+    # Solo si de verdad achica
+    return packed if len(packed) < len(data) else value
+
+
+def decode_value(value):
+    """Inversa de encode_value (también registrada como función SQL)."""
+    if not isinstance(value, bytes):
+        return value
+
+    codec, data = value[:1], value[1:]
+    if codec == _CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Valor comprimido con zstd: instalar zstandard")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _source_from_key(key: str):
+    """Claves cortas = texto normalizado (sirve como source); hash → None."""
+    if key.startswith(HASH_PREFIX) or migrate_key_v1(key) is None:
+        return None
+    return key
+
+
+def _fts_query(query: str) -> str:
+    """
+    Texto del usuario → consulta FTS5 segura: cada término entre comillas
+    (sin operadores ni errores de sintaxis), todos requeridos.
+    """
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+def _open_text(path, mode):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _iter_pack_rows(path, namespace=None):
+    """Stream de (ns, key, value, created_at, source) desde un .db o un JSONL."""
+    if str(path).endswith(".db"):
+        conn = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(translations)")}
+
+            if "source" in columns:
+                for ns, key, value, created_at, source in conn.execute(SQL_EXPORT):
+                    yield (
+                        ns if namespace is None else namespace,
+                        key, decode_value(value), created_at, source
+                    )
+            elif "ns" in columns:
+                for ns, key, value, created_at in conn.execute(
+                    "SELECT ns, key, value, created_at FROM translations"
+                ):
+                    yield (
+                        ns if namespace is None else namespace,
+                        key, value, created_at, _source_from_key(key)
+                    )
+            else:
+                # Esquema v1: claves a formato actual (las md5 no se pueden)
+                for old_key, value, created_at in conn.execute(
+                    "SELECT key, value, created_at FROM translations"
+                ):
+                    key = migrate_key_v1(old_key)
+                    if key is not None:
+                        yield namespace or "", key, value, created_at, _source_from_key(key)
+        finally:
+            conn.close()
+        return
+
+    with _open_text(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            yield (
+                row.get("ns", "") if namespace is None else namespace,
+                row["key"],
+                row["value"],
+                row.get("created_at"),
+                row.get("source") or _source_from_key(row["key"]),
+            )
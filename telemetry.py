@@ -21,4 +21,9 @@ meter = metrics.get_meter("dstranslator")
 cache_hits = meter.create_counter("cache_hits", description="Cache hits RAM+SQLite")
 cache_misses = meter.create_counter("cache_misses", description="Cache misses")
 translations_total = meter.create_counter("translations_total", description="Traducciones completadas")
-queue_size = meter.create_up_down_counter("queue_size", description="Textos en cola")
\ No newline at end of file
+speculations = meter.create_counter("speculations", description="Traducciones especulativas del SpeechBuffer (done / superseded)")
+queue_size = meter.create_up_down_counter("queue_size", description="Textos en cola")
+cache_fuzzy_score = meter.create_histogram("cache_fuzzy_score", description="Similitud de los hits del tier fuzzy (0-1)")
+prompt_tokens = meter.create_histogram("prompt_tokens", description="Tokens de entrada por request (usage de la API)")
+prompt_cache_hit_tokens = meter.create_counter("prompt_cache_hit_tokens", description="Tokens de entrada servidos por la cache de prefijo de la API")
+prompt_tokens_saved = meter.create_counter("prompt_tokens_saved", description="Tokens de nombres no enviados por el prompt slim (estimado)")
\ No newline at end of file
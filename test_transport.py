@@ -0,0 +1,181 @@
+"""
+Tests del transporte de DeepSeekClient contra un servidor falso local
+(aiohttp): reintentos, Retry-After, circuit breaker y hedging.
+
+Uso:
+    python -m unittest test_transport
+"""
+
+import asyncio
+import json
+import time
+import unittest
+
+try:
+    from aiohttp import web
+    from deepseek_client import DeepSeekClient
+    from http_resilience import ApiError, CircuitOpenError
+except ImportError:  # aiohttp / opentelemetry no instalados
+    web = None
+
+
+class FakeApi:
+    """
+    Endpoint chat/completions falso. plan: comportamiento por request
+    (status, Retry-After) | "slow" | "broken" | "ok" (por defecto).
+    """
+
+    def __init__(self):
+        self.plan = []
+        self.hits = 0
+
+    async def handle(self, request):
+        body = await request.json()
+        self.hits += 1
+        step = self.plan.pop(0) if self.plan else "ok"
+
+        if isinstance(step, tuple):
+            status, retry_after = step
+            headers = {} if retry_after is None else {"Retry-After": str(retry_after)}
+            return web.Response(status=status, text='{"error": "fake"}', headers=headers)
+
+        if step == "slow":
+            await asyncio.sleep(2)
+            if request.transport is None or request.transport.is_closing():
+                return web.Response()  # el cliente ya canceló (perdió el hedge)
+
+        if not body.get("stream"):
+            if step == "broken":
+                return web.Response(text="{no es json", content_type="application/json")
+            return web.json_response({
+                "choices": [{"message": {"content": "<<<1>>>\nHello"}}],
+                "usage": {"prompt_tokens": 10},
+            })
+
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        if step == "broken":
+            await resp.write(b"data: {roto\n\n")
+            return resp
+        for word in ("Hel", "lo"):
+            event = {"choices": [{"delta": {"content": word}}]}
+            await resp.write(f"data: {json.dumps(event)}\n\n".encode())
+        await resp.write(b"data: [DONE]\n\n")
+        return resp
+
+
+@unittest.skipIf(web is None, "requiere aiohttp y opentelemetry")
+class TransportTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.api = FakeApi()
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.api.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", 0).start()
+        port = self.runner.addresses[0][1]
+
+        self.client = DeepSeekClient(
+            "test-key",
+            api_url=f"http://127.0.0.1:{port}/v1/chat/completions",
+            breaker_threshold=3,
+            breaker_cooldown=0.2
+        )
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.runner.cleanup()
+
+    async def translate(self):
+        return "".join([c async for c in self.client.translate_stream("hola, ¿qué tal?")])
+
+    # ==========================
+    # REINTENTOS / RETRY-AFTER
+    # ==========================
+    async def test_retries_retryable_status(self):
+        self.api.plan = [(503, 0), (429, 0.1)]
+        self.assertEqual(await self.translate(), "Hello")
+        self.assertEqual(self.api.hits, 3)
+
+    async def test_client_error_not_retried(self):
+        self.api.plan = [(400, None)]
+        with self.assertRaises(ApiError):
+            await self.translate()
+        self.assertEqual(self.api.hits, 1)
+        self.assertEqual(self.client.breaker.state, "closed")
+
+    async def test_retry_after_is_honored(self):
+        self.api.plan = [(429, 0.3)]
+        t_start = time.monotonic()
+        self.assertEqual(await self.translate(), "Hello")
+        self.assertGreaterEqual(time.monotonic() - t_start, 0.3)
+
+    async def test_long_retry_after_opens_circuit(self):
+        self.api.plan = [(429, 60)]
+        with self.assertRaises(ApiError):
+            await self.translate()
+        self.assertEqual(self.client.breaker.state, "open")
+
+        with self.assertRaises(CircuitOpenError):
+            await self.translate()
+        self.assertEqual(self.api.hits, 1)
+
+    # ==========================
+    # CIRCUIT BREAKER
+    # ==========================
+    async def test_breaker_opens_and_half_open_probe_closes(self):
+        self.client.max_retries = 5
+        self.api.plan = [(500, 0)] * 3
+        with self.assertRaises(ApiError):
+            await self.translate()
+        self.assertEqual(self.api.hits, 3)
+        self.assertEqual(self.client.breaker.state, "open")
+
+        await asyncio.sleep(0.25)
+        self.assertEqual(self.client.breaker.state, "half-open")
+        self.assertEqual(await self.translate(), "Hello")
+        self.assertEqual(self.client.breaker.state, "closed")
+
+    async def test_broken_probe_does_not_wedge_breaker(self):
+        self.client.breaker.open_until = time.monotonic() - 0.01  # half-open
+        self.api.plan = ["broken"]
+        with self.assertRaises(ValueError):
+            await self.translate()
+        self.assertEqual(self.client.breaker.state, "open")
+
+        await asyncio.sleep(0.25)
+        self.assertEqual(await self.translate(), "Hello")
+        self.assertEqual(self.client.breaker.state, "closed")
+
+    async def test_broken_json_once(self):
+        self.api.plan = ["broken"]
+        with self.assertRaises(ValueError):
+            await self.client.translate_batch([(None, "hola")])
+        self.assertEqual(await self.client.translate_batch([(None, "hola")]), ["Hello"])
+
+    # ==========================
+    # HEDGING
+    # ==========================
+    async def test_hedge_after_p95(self):
+        self.client.hedge = True
+        self.client.hedge_min = 0.2
+        for _ in range(20):
+            await self.translate()
+        self.assertEqual(self.client._hedge_delay("stream"), 0.2)
+
+        self.api.hits = 0
+        self.api.plan = ["slow"]
+        t_start = time.monotonic()
+        self.assertEqual(await self.translate(), "Hello")
+        self.assertLess(time.monotonic() - t_start, 1.0)
+        self.assertEqual(self.api.hits, 2)
+
+    async def test_no_hedge_by_default(self):
+        for _ in range(20):
+            await self.translate()
+        self.assertIsNone(self.client._hedge_delay("stream"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,100 +1,64 @@
 import threading
-from collections import OrderedDict
-import hashlib
-import re  # ✅ AÑADIR
+
+from cache_keys import make_key
+from cache_policies import make_policy
 
 
 class TranslationCache:
-    def __init__(self, max_size=500):
-        self.cache = OrderedDict()
+    """
+    Cache RAM thread-safe.
+    policy: lru (original) | slru | tinylfu (resistente a barridos)
+    trace_path: si se indica, cada get() anota la clave (para bench_cache_policies.py)
+    """
+
+    def __init__(self, max_size=500, policy="lru", trace_path=None):
+        self.cache = make_policy(policy, max_size)
+        self.policy = policy
         self.max_size = max_size
         self.lock = threading.Lock()
         self.hits = 0
         self.misses = 0
-    
-    def _normalize_key(self, text: str) -> str:
-        """
-        Normaliza el texto para mejor matching
-        ✅ MEJORADO: +10-15% cache hit rate
-        """
-        # --------------------------
-        # Normalización base (existente)
-        # --------------------------
-
-        # Remueve espacios extra, newlines múltiples
-        normalized = ' '.join(text.strip().split())
-        
-        # ✅ EXISTENTE: Normalizar comillas japonesas
-        normalized = normalized.replace('『', '「').replace('』', '」')
-        
-        # ✅ EXISTENTE: Normalizar puntos suspensivos
-        normalized = normalized.replace('…', '...')
-        
-        # ✅ EXISTENTE: Remover espacios alrededor de comillas japonesas
-        normalized = re.sub(r'\s*「\s*', '「', normalized)
-        normalized = re.sub(r'\s*」\s*', '」', normalized)
-
-        # --------------------------
-        # ➕ EXTENSIÓN MULTI-IDIOMA
-        # (NO elimina lo anterior)
-        # --------------------------
-
-        # Normalizar comillas comunes (inglés, francés, alemán, etc.)
-        QUOTE_MAP = {
-            '“': '"',
-            '”': '"',
-            '„': '"',
-            '«': '"',
-            '»': '"',
-            '‘': "'",
-            '’': "'",
-            '‚': "'",
-        }
-
-        for src, dst in QUOTE_MAP.items():
-            normalized = normalized.replace(src, dst)
-
-        # Remover espacios alrededor de comillas comunes
-        normalized = re.sub(r'\s*"\s*', '"', normalized)
-        normalized = re.sub(r"\s*'\s*", "'", normalized)
-
-        # --------------------------
-        # Hash para textos largos
-        # --------------------------
 
-        # Si es muy largo, usa hash
-        if len(normalized) > 200:
-            return hashlib.md5(normalized.encode()).hexdigest()
-        
-        return normalized
-
-    def get(self, key: str):
+        self._trace = open(trace_path, "a", encoding="utf-8", buffering=1) if trace_path else None
+    
+    def get(self, key: str, namespace: str = ""):
         """Obtiene traducción del cache (thread-safe)"""
-        normalized_key = self._normalize_key(key)
+        normalized_key = (namespace, make_key(key))
         
         with self.lock:
-            if normalized_key in self.cache:
-                self.cache.move_to_end(normalized_key)
+            if self._trace:
+                self._trace.write(normalized_key[1].replace("\n", " ") + "\n")
+
+            value = self.cache.get(normalized_key)
+            if value is not None:
                 self.hits += 1
-                return self.cache[normalized_key]
+                return value
             
             self.misses += 1
             return None
 
-    def set(self, key: str, value: str):
+    def set(self, key: str, value: str, namespace: str = ""):
         """Guarda traducción en cache (thread-safe)"""
-        normalized_key = self._normalize_key(key)
+        normalized_key = (namespace, make_key(key))
         
         with self.lock:
-            if normalized_key in self.cache:
-                self.cache.move_to_end(normalized_key)
-                return
-            
-            self.cache[normalized_key] = value
-            
-            if len(self.cache) > self.max_size:
-                self.cache.popitem(last=False)
+            self.cache.put(normalized_key, value)
     
+    def load(self, items, namespace: str = ""):
+        """
+        Precarga (warm-up) con claves ya normalizadas.
+        items: (key, value) del más usado al menos usado; se insertan
+        al revés para que los más usados queden como los más recientes.
+        No cuenta como hits/misses.
+        """
+        items = list(items)[:self.max_size]
+
+        with self.lock:
+            for key, value in reversed(items):
+                self.cache.put((namespace, key), value)
+
+        return len(items)
+
     def clear(self):
         """Limpia el cache completamente"""
         with self.lock:
@@ -102,6 +66,13 @@ class TranslationCache:
             self.hits = 0
             self.misses = 0
     
+    def close(self):
+        """Cierra el archivo de trace (si hay)"""
+        with self.lock:
+            if self._trace:
+                self._trace.close()
+                self._trace = None
+
     def get_stats(self):
         """Retorna estadísticas del cache"""
         with self.lock:
@@ -111,6 +82,7 @@ class TranslationCache:
             return {
                 "size": len(self.cache),
                 "max_size": self.max_size,
+                "policy": self.policy,
                 "hits": self.hits,
                 "misses": self.misses,
                 "hit_rate": f"{hit_rate:.1f}%"
@@ -1,19 +1,46 @@
 import asyncio
 import threading
 import time
-from telemetry import tracer, cache_hits, cache_misses, translations_total, queue_size
+from collections import deque
+from telemetry import (
+    tracer,
+    cache_hits,
+    cache_misses,
+    cache_fuzzy_score,
+    speculations,
+    translations_total,
+    queue_size
+)
+
+from cache_keys import make_key
 
 from utils_text import (
+    NameIndex,
     es_dialogo_trivial,
     detectar_speaker_inline
 )
 
 
+class _QueueDropped(Exception):
+    """El item fue descartado de la cola (backlog lleno o reset)."""
+
+
+class _BatchFallback(Exception):
+    """El batch que llevaba este item falló → reintentar individual."""
+
+
 class TranslationWorker:
     """
     Maneja:
-    - busy + cola (pending_texts)
+    - scheduler: hasta max_concurrency llamadas API en paralelo
+      + cola acotada (pending_texts, máx pending_max)
+    - entrega en orden de llegada (seq) a current_translation / mini_context
     - cache RAM + sqlite
+    - single-flight: textos idénticos en vuelo comparten una sola llamada API
+    - batch: con backlog, un slot se lleva varios textos encolados
+      en un solo request (tamaño según profundidad de la cola)
+    - especulación: el contenido del SpeechBuffer se traduce antes del
+      flush (sin publicar); el flush lo encuentra en vuelo o en cache
     - mini_context
     - llamada DeepSeek
     - current_translation (para API Flask / overlay)
@@ -21,6 +48,10 @@ class TranslationWorker:
     NUEVO:
     - context_active: True/False cuando se usó mini-context en la última traducción
       (para mostrar indicador en el logo/overlay)
+    - partial: True mientras la traducción llega por streaming; el texto
+      crece bajo el mismo id y termina con partial=False
+    - rev: contador de publicaciones (incluye parciales y reset);
+      cursor para long-poll / SSE (wait_for_update, subscribe)
     """
 
     def __init__(
@@ -29,13 +60,26 @@ class TranslationWorker:
         cache,
         sqlite_cache,
         KNOWN_NAMES,
-        pending_max=20
+        pending_max=20,
+        max_concurrency=3,
+        fuzzy=None,
+        batch_max=8,
+        batch_chars=2000
     ):
         self.deepseek = deepseek
         self.cache = cache
         self.sqlite_cache = sqlite_cache
         self.KNOWN_NAMES = KNOWN_NAMES
+        self.name_index = NameIndex(KNOWN_NAMES)
         self.pending_max = pending_max
+        self.max_concurrency = max_concurrency
+
+        # Batch: máx textos por request (1 = desactivado) y tope de caracteres
+        self.batch_max = batch_max
+        self.batch_chars = batch_chars
+
+        # Tier de similitud opcional (FuzzyIndex) detrás de RAM + SQLite
+        self.fuzzy = fuzzy
 
         self.translation_lock = threading.Lock()
         self.current_translation = {
@@ -43,11 +87,36 @@ class TranslationWorker:
             "id": 0,
             "busy": False,
             "context_active": False,
+            "partial": False,
+            "rev": 0,
         }
 
-        self.pending_texts = []
+        # Push al overlay: hilos (Condition) y loops asyncio (colas)
+        self._changed = threading.Condition(self.translation_lock)
+        self._subscribers = set()  # (loop, asyncio.Queue)
+
+        # Cola de espera por slot API: (texto, future)
+        self.pending_texts = deque()
         self.mini_context = []
 
+        # Scheduler
+        self._loop = None
+        self._active = 0          # llamadas API en curso
+        self._in_flight = 0       # textos aceptados aún no entregados
+
+        # Entrega ordenada
+        self._epoch = 0           # cambia en reset → resultados viejos se ignoran
+        self._next_seq = 0        # próximo seq a asignar
+        self._deliver_seq = 0     # próximo seq a publicar
+        self._ready = {}          # seq -> resultado listo (fuera de orden)
+        self._partial_seq = None  # seq que ya publicó parciales
+
+        # Single-flight: cache key -> future de la llamada API en curso
+        self._inflight = {}
+
+        # Especulación en curso: (texto, task) o None
+        self._speculative = None
+
     # ==========================
     # ESTADO ACTUAL (API)
     # ==========================
@@ -62,183 +131,836 @@ class TranslationWorker:
                 "id": 0,
                 "busy": False,
                 "context_active": False,
+                "partial": False,
             })
-        self.pending_texts.clear()
+            self._epoch += 1
+            self._ready.clear()
+            self._deliver_seq = self._next_seq
+            self._partial_seq = None
+            self._in_flight = 0
+            self.current_translation["rev"] += 1
+            self._notify_locked()
+
+        # Las futures de la cola viven en el loop del worker
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._drop_pending)
+            self._loop.call_soon_threadsafe(self._supersede, None)
+
         self.mini_context.clear()
 
+    # ==========================
+    # NAMESPACE (idioma | modelo | prompt)
+    # ==========================
+    @property
+    def namespace(self):
+        return self.deepseek.cache_namespace if self.deepseek else ""
+
     # ==========================
     # CACHE DIRECTO (para watcher)
     # ==========================
     def get_cached_translation(self, texto: str):
-        cached = self.cache.get(texto)
+        ns = self.namespace
+
+        cached = self.cache.get(texto, ns)
         if cached:
+            self.sqlite_cache.touch(texto, ns)
             return cached
 
-        cached = self.sqlite_cache.get(texto)
+        cached = self.sqlite_cache.get(texto, ns)
         if cached:
-            self.cache.set(texto, cached)
+            self.cache.set(texto, cached, ns)
             return cached
 
         return None
 
+    # ==========================
+    # WARM-UP (SQLite → RAM al arrancar)
+    # ==========================
+    def warm_start(self, namespace=None, limit=None):
+        """
+        Carga en RAM las traducciones más usadas del namespace
+        (una sola consulta en streaming). Pensado para un hilo aparte.
+        """
+        ns = self.namespace if namespace is None else namespace
+        limit = limit or self.cache.max_size
+
+        t_start = time.time()
+        loaded = self.cache.load(self.sqlite_cache.iter_warm(ns, limit), ns)
+        print(f"[Cache] 🔥 Warm-up RAM: {loaded} entradas ({round((time.time() - t_start) * 1000)}ms)")
+        return loaded
+
     def set_current_translation(self, translated: str):
+        self._publish(translated, context_active=False)
+
+    def _publish(self, text: str, partial=False, same_id=False, context_active=None):
+        """
+        Publica texto en current_translation.
+        same_id=True → actualización parcial de la traducción actual.
+        """
         with self.translation_lock:
-            self.current_translation["text"] = translated
+            self._publish_locked(text, partial, same_id, context_active)
+
+    def _publish_locked(self, text, partial=False, same_id=False, context_active=None):
+        self.current_translation["text"] = text
+        if not same_id:
             self.current_translation["id"] += 1
-            self.current_translation["context_active"] = False
+        self.current_translation["partial"] = partial
+        if context_active is not None:
+            self.current_translation["context_active"] = context_active
+        self.current_translation["rev"] += 1
+        self._notify_locked()
+
+    # ==========================
+    # PUSH (long-poll / SSE)
+    # ==========================
+    def _notify_locked(self):
+        self._changed.notify_all()
+
+        if self._subscribers:
+            snapshot = dict(self.current_translation)
+            for loop, q in list(self._subscribers):
+                loop.call_soon_threadsafe(self._offer, q, snapshot)
+
+    @staticmethod
+    def _offer(q, snapshot):
+        # Cliente lento → se descarta lo más viejo, siempre recibe lo último
+        if q.full():
+            q.get_nowait()
+        q.put_nowait(snapshot)
+
+    def wait_for_update(self, since_rev: int, timeout: float = 25):
+        """
+        Bloquea (sin polling) hasta que rev > since_rev o timeout.
+        Retorna el estado actual en ambos casos.
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self.current_translation["rev"] > since_rev,
+                timeout
+            )
+            return dict(self.current_translation)
+
+    def subscribe(self, maxsize: int = 16):
+        """
+        Cola asyncio que recibe cada publicación (llamar desde el loop
+        del cliente). Sin hilos por cliente.
+        """
+        q = asyncio.Queue(maxsize=maxsize)
+        with self.translation_lock:
+            self._subscribers.add((asyncio.get_running_loop(), q))
+        return q
+
+    def unsubscribe(self, q):
+        with self.translation_lock:
+            self._subscribers = {(l, s) for l, s in self._subscribers if s is not q}
+
+    # ==========================
+    # SCHEDULER (slots API + cola acotada)
+    # ==========================
+    async def _acquire_slot(self, texto: str, batch_item=None):
+        """
+        Espera un slot libre para llamar a la API.
+        Si la cola supera pending_max se descarta el más antiguo.
+
+        batch_item: (speaker, dialogo) si el texto puede ir en un batch.
+        Retorna True (slot propio) o un future con la traducción
+        si otro slot se lo llevó en su batch.
+        """
+        with self.translation_lock:
+            if self._active < self.max_concurrency and not self.pending_texts:
+                self._active += 1
+                return True
+
+            fut = self._loop.create_future()
+            self.pending_texts.append((texto, fut, batch_item))
+            queue_size.add(1)
+            print(f"[Queue] Busy → encolado ({len(self.pending_texts)}): {texto[:60]}")
+
+            dropped = None
+            if len(self.pending_texts) > self.pending_max:
+                dropped = self.pending_texts.popleft()
+                queue_size.add(-1)
+
+        if dropped:
+            print(f"[Queue] Lleno → descartado: {dropped[0][:60]}")
+            if not dropped[1].done():
+                dropped[1].set_exception(_QueueDropped())
+
+        # El slot se transfiere desde _release_slot (o un batch se lleva el item)
+        try:
+            grant = await fut
+        except asyncio.CancelledError:
+            # Cancelado justo después de recibir el slot → devolverlo
+            if fut.done() and not fut.cancelled() and fut.exception() is None \
+                    and fut.result() is True:
+                self._release_slot()
+            raise
+
+        if grant is True:
+            print(f"[Queue] Dequeue → traduciendo: {texto[:60]}")
+        return grant
+
+    def _release_slot(self):
+        with self.translation_lock:
+            while self.pending_texts:
+                _, fut, _ = self.pending_texts.popleft()
+                queue_size.add(-1)
+                if not fut.done():
+                    fut.set_result(True)
+                    return
+            self._active -= 1
+
+    def _drop_pending(self):
+        with self.translation_lock:
+            dropped = list(self.pending_texts)
+            self.pending_texts.clear()
+
+        for _, fut, _ in dropped:
+            queue_size.add(-1)
+            if not fut.done():
+                fut.set_exception(_QueueDropped())
+
+    def _claim_batch(self):
+        """
+        Con backlog, el dueño de un slot se lleva textos encolados.
+        Tamaño: backlog repartido entre los slots (ceil), hasta batch_max.
+        Retorna [(texto, (speaker, dialogo), future_resultado)].
+        """
+        if self.batch_max < 2:
+            return []
+
+        with self.translation_lock:
+            depth = len(self.pending_texts)
+            if not depth:
+                return []
+
+            size = min(self.batch_max - 1, -(-depth // self.max_concurrency))
+            claimed, keep = [], []
+            chars = 0
+
+            for entry in self.pending_texts:
+                texto, fut, item = entry
+                if (
+                    len(claimed) < size
+                    and item is not None
+                    and not fut.done()
+                    and chars + len(texto) <= self.batch_chars
+                ):
+                    claimed.append(entry)
+                    chars += len(texto)
+                else:
+                    keep.append(entry)
+
+            self.pending_texts.clear()
+            self.pending_texts.extend(keep)
+
+        batch = []
+        for texto, fut, item in claimed:
+            queue_size.add(-1)
+            result_fut = self._loop.create_future()
+            fut.set_result(result_fut)
+            batch.append((texto, item, result_fut))
+        return batch
+
+    @staticmethod
+    def _fail_batch(batch):
+        for _, _, fut in batch:
+            if not fut.done():
+                fut.set_exception(_BatchFallback())
+                fut.exception()  # marcado como leído si nadie espera
+
+    # ==========================
+    # ENTREGA ORDENADA
+    # ==========================
+    def _reserve_seq(self):
+        with self.translation_lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._in_flight += 1
+            self.current_translation["busy"] = True
+            return seq, self._epoch
+
+    def _is_head(self, seq, epoch):
+        return epoch == self._epoch and seq == self._deliver_seq
+
+    def _complete(self, seq, epoch, result):
+        """
+        Registra el resultado de seq y publica todos los
+        consecutivos disponibles (orden de llegada).
+        result=None → no publica nada (trivial / descartado).
+        """
+        with self.translation_lock:
+            if epoch != self._epoch:
+                return
+
+            self._ready[seq] = result
+            self._in_flight -= 1
+
+            while self._deliver_seq in self._ready:
+                ready_seq = self._deliver_seq
+                res = self._ready.pop(ready_seq)
+                self._deliver_seq += 1
+
+                if res is None:
+                    continue
+
+                if res.get("text") is not None:
+                    self._publish_locked(
+                        res["text"],
+                        same_id=self._partial_seq == ready_seq,
+                        context_active=res["context_active"]
+                    )
+                else:
+                    self.current_translation["context_active"] = res["context_active"]
+
+                # MINI CONTEXTO (guardar, en orden)
+                if res.get("context_add"):
+                    self.mini_context.append(res["context_add"])
+                    if len(self.mini_context) > 8:
+                        self.mini_context.pop(0)
+
+            self.current_translation["busy"] = self._in_flight > 0
 
     # ==========================
     # WORKER ASYNC
     # ==========================
     async def traducir_texto(self, texto: str):
-        # ==========================
-        # BUSY + COLA
-        # ==========================
+        """
+        Traduce texto respetando el orden de llegada.
+        Retorna la traducción (o None si fue trivial / descartado).
+        """
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+
+        # Un texto real reemplaza a la especulación de otro texto,
+        # o adopta la del mismo (ya nada la cancela: este flush la espera)
+        self._supersede(texto, adopt=True)
+
+        seq, epoch = self._reserve_seq()
+        result = None
+
+        try:
+            with tracer.start_as_current_span("traducir_texto") as span:
+                span.set_attribute("texto.length", len(texto))
+                span.set_attribute("seq", seq)
+
+                try:
+                    result = await self._resolve(texto, seq, epoch, span)
+
+                except _QueueDropped:
+                    span.set_attribute("resultado", "queue_dropped")
+
+                except Exception as e:
+                    print(f"[Worker] Error: {e}")
+                    span.record_exception(e)
+                    result = {"text": f"[Error: {e}]", "context_active": False}
+
+        finally:
+            self._complete(seq, epoch, result)
+
+        return result.get("text") if result else None
+
+    # ==========================
+    # ESPECULACIÓN (SpeechBuffer)
+    # ==========================
+    async def speculate(self, texto, delay=0.5):
+        """
+        Traduce en background lo que hay en el SpeechBuffer, sin publicar
+        (no reserva seq). Si el buffer se vacía sin cambios, traducir_texto
+        comparte la llamada en vuelo (single-flight) o la encuentra en RAM.
+        Una especulación nueva (o un texto real distinto) cancela la
+        anterior; delay evita pagar un request por cada fragmento seguido.
+        texto=None → solo cancela.
+        """
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+
+        self._supersede(texto)
+        if not texto or self._speculative is not None:
+            return
+
+        task = asyncio.current_task()
+        self._speculative = (texto, task)
+        try:
+            await asyncio.sleep(delay)
+            await self._speculate(texto)
+        except asyncio.CancelledError:
+            speculations.add(1, {"result": "superseded"})
+        except Exception as e:
+            print(f"[Spec] Error: {e}")
+        finally:
+            if self._speculative is not None and self._speculative[1] is task:
+                self._speculative = None
+
+    async def _speculate(self, texto: str):
+        ns = self.namespace
+
+        speaker, dialogo = self._detect_speaker(texto)
+        lineas = [l.strip() for l in texto.split("\n") if l.strip()]
+        if len(lineas) == 1 and es_dialogo_trivial(dialogo):
+            return
+
+        key = (ns, make_key(texto))
+        if key in self._inflight or self._lookup_exact(texto, ns):
+            return
+
+        # Solo con un slot libre: nunca compite con textos reales en cola
         with self.translation_lock:
-            if self.current_translation["busy"]:
-                self.pending_texts.append(texto)
-                if len(self.pending_texts) > self.pending_max:
-                    self.pending_texts.pop(0)
-                queue_size.add(1)
-                print(f"[Queue] Busy → encolado ({len(self.pending_texts)}): {texto[:60]}")
+            if self._active >= self.max_concurrency or self.pending_texts:
                 return
 
-            self.current_translation["busy"] = True
+        print(f"[Spec] 🔮 Especulando: {texto[:60]}")
+        t_start = time.time()
 
-        with tracer.start_as_current_span("traducir_texto") as span:
+        with tracer.start_as_current_span("especulacion") as span:
             span.set_attribute("texto.length", len(texto))
 
-            try:
-                # ======================
-                # SPEAKER (informativo)
-                # ======================
-                speaker, dialogo = detectar_speaker_inline(
-                    texto,
-                    known_names=self.KNOWN_NAMES
+            # Mismo camino que el flush (_resolve): con líneas ya en cache
+            # solo van las faltantes, bajo la misma clave single-flight.
+            # seq=None → nunca es cabeza: no publica parciales
+            res = None
+            if len(lineas) > 1:
+                res = await self._resolve_segments(texto, lineas, ns, None, self._epoch, span)
+
+            if res is None:
+                resultado, _, nuevo = await self._translate(
+                    texto, speaker, dialogo, ns, None, self._epoch, span
                 )
+                if nuevo and len(lineas) > 1:
+                    self._store_segments(lineas, resultado, ns)
+
+        speculations.add(1, {"result": "done"})
+        print(f"[Spec] ✅ Lista ({round((time.time() - t_start) * 1000)}ms): {texto[:60]}")
+
+    def _supersede(self, texto=None, adopt=False):
+        """
+        Cancela la especulación en curso si no es de este texto.
+        adopt=True (flush real del mismo texto) → se suelta sin cancelar.
+        """
+        spec = self._speculative
+        if spec is None:
+            return
+        if spec[0] == texto:
+            if adopt:
+                self._speculative = None
+            return
+
+        self._speculative = None
+        if not spec[1].done():
+            spec[1].cancel()
+            print(f"[Spec] ✂️ Reemplazada: {spec[0][:60]}")
+
+    async def _resolve(self, texto: str, seq, epoch, span):
+        ns = self.namespace
+
+        # ======================
+        # SPEAKER (informativo)
+        # ======================
+        speaker, dialogo = self._detect_speaker(texto)
+
+        print(f"[Speaker] {speaker if speaker else '(narración)'}")
+        if speaker:
+            span.set_attribute("speaker", speaker)
+
+        # ======================
+        # FILTRO GLOBAL
+        # ======================
+        lineas = [l.strip() for l in texto.split("\n") if l.strip()]
+        if len(lineas) == 1 and es_dialogo_trivial(dialogo):
+            print(f"[Skip] Trivial: {dialogo}")
+            span.set_attribute("resultado", "trivial_skip")
+            return {"text": None, "context_active": False}
+
+        # ======================
+        # CACHE RAM
+        # ======================
+        cached = self.cache.get(texto, ns)
+        if cached:
+            self.sqlite_cache.touch(texto, ns)
+            print("[Cache] 💾 RAM HIT")
+            cache_hits.add(1, {"type": "ram"})
+            span.set_attribute("resultado", "cache_ram")
+            return {"text": cached, "context_active": False}
+
+        # ======================
+        # CACHE SQLITE
+        # ======================
+        cached = self.sqlite_cache.get(texto, ns)
+        if cached:
+            print("[Cache] 💿 SQLITE HIT")
+            cache_hits.add(1, {"type": "sqlite"})
+            span.set_attribute("resultado", "cache_sqlite")
+            self.cache.set(texto, cached, ns)
+            return {"text": cached, "context_active": False}
+
+        # ======================
+        # CACHE FUZZY (ruido OCR / clipboard)
+        # ======================
+        cached = self._fuzzy_lookup(texto, ns, span)
+        if cached:
+            # Sin promover a RAM/SQLite: el hit es de OTRA clave
+            return {"text": cached, "context_active": False}
+
+        # ======================
+        # CACHE POR LÍNEA (bloques agrupados distinto)
+        # ======================
+        if len(lineas) > 1:
+            res = await self._resolve_segments(texto, lineas, ns, seq, epoch, span)
+            if res is not None:
+                return res
+
+        # ======================
+        # CACHE MISS → API
+        # ======================
+        resultado_final, use_context, nuevo = await self._translate(
+            texto, speaker, dialogo, ns, seq, epoch, span
+        )
+
+        if not nuevo:
+            return {"text": resultado_final, "context_active": False}
+
+        if len(lineas) > 1:
+            self._store_segments(lineas, resultado_final, ns)
+
+        return {
+            "text": resultado_final,
+            "context_active": use_context,
+            "context_add": None if es_dialogo_trivial(dialogo) else resultado_final,
+        }
 
-                if not speaker:
-                    speaker, dialogo = self.deepseek._extract_speaker(texto)
-
-                print(f"[Speaker] {speaker if speaker else '(narración)'}")
-                if speaker:
-                    span.set_attribute("speaker", speaker)
-
-                # ======================
-                # FILTRO GLOBAL
-                # ======================
-                lineas = [l for l in texto.split("\n") if l.strip()]
-                if len(lineas) == 1 and es_dialogo_trivial(dialogo):
-                    print(f"[Skip] Trivial: {dialogo}")
-                    span.set_attribute("resultado", "trivial_skip")
-                    with self.translation_lock:
-                        self.current_translation["context_active"] = False
-                    return
+    def _detect_speaker(self, texto: str):
+        speaker, dialogo = detectar_speaker_inline(
+            texto,
+            known_names=self.name_index
+        )
 
-                # ======================
-                # CACHE RAM
-                # ======================
-                cached = self.cache.get(texto)
-                if cached:
-                    print("[Cache] 💾 RAM HIT")
-                    cache_hits.add(1, {"type": "ram"})
-                    span.set_attribute("resultado", "cache_ram")
-                    with self.translation_lock:
-                        self.current_translation["text"] = cached
-                        self.current_translation["id"] += 1
-                        self.current_translation["context_active"] = False
-                    return
+        if not speaker:
+            speaker, dialogo = self.deepseek._extract_speaker(texto)
 
-                # ======================
-                # CACHE SQLITE
-                # ======================
-                cached = self.sqlite_cache.get(texto)
-                if cached:
-                    print("[Cache] 💿 SQLITE HIT")
-                    cache_hits.add(1, {"type": "sqlite"})
-                    span.set_attribute("resultado", "cache_sqlite")
-                    self.cache.set(texto, cached)
-                    with self.translation_lock:
-                        self.current_translation["text"] = cached
-                        self.current_translation["id"] += 1
-                        self.current_translation["context_active"] = False
-                    return
+        return speaker, dialogo
 
-                # ======================
-                # CACHE MISS → API
-                # ======================
-                cache_misses.add(1)
-                span.set_attribute("resultado", "api_call")
+    async def _translate(self, texto: str, speaker, dialogo, ns, seq, epoch, span,
+                         extra_context="", render=None):
+        """
+        Single-flight + slot + API; guarda el resultado en los tiers.
+        Retorna (resultado, use_context, nuevo); nuevo=False si se compartió
+        una llamada ya en vuelo.
+        """
+        key = (ns, make_key(texto))
 
-                # ======================
-                # CONTEXTO (mini-context)
-                # ======================
-                use_context = len(texto) > 25 and len(self.mini_context) > 0
-                context_text = "\n".join(self.mini_context[-5:]) if use_context else ""
+        # ======================
+        # EN VUELO (single-flight)
+        # ======================
 
-                with self.translation_lock:
-                    self.current_translation["context_active"] = use_context
+        while key in self._inflight:
+            try:
+                resultado_final, _ = await asyncio.shield(self._inflight[key])
+            except _QueueDropped:
+                # El original se descartó de la cola → este pasa a ser el líder
+                continue
+
+            print("[Dedup] ⏳ HIT en vuelo → resultado compartido")
+            cache_hits.add(1, {"type": "inflight"})
+            span.set_attribute("resultado", "inflight_shared")
+            return resultado_final, False, False
+
+        cache_misses.add(1)
+        span.set_attribute("resultado", "api_call")
+
+        shared = self._loop.create_future()
+        self._inflight[key] = shared
+
+        try:
+            resultado_final, use_context = await self._call_scheduled(
+                texto, speaker, dialogo, seq, epoch, span,
+                extra_context=extra_context, render=render
+            )
+
+            shared.set_result((resultado_final, use_context))
+
+        except BaseException as e:
+            shared.set_exception(
+                e if isinstance(e, Exception) else _QueueDropped()
+            )
+            shared.exception()  # marcado como leído si nadie espera
+            raise
+
+        finally:
+            self._inflight.pop(key, None)
+
+        self.cache.set(texto, resultado_final, ns)
+        self.sqlite_cache.set(texto, resultado_final, ns)
+        if self.fuzzy is not None:
+            self.fuzzy.add(*key)
+
+        translations_total.add(1)
+
+        return resultado_final, use_context, True
+
+    async def _call_scheduled(self, texto: str, speaker, dialogo, seq, epoch, span,
+                              extra_context="", render=None):
+        """
+        Slot → API. Con backlog, este texto puede viajar en el batch
+        de otro slot, o llevarse otros textos encolados en el suyo.
+        Los textos con contexto de segmentos van siempre solos.
+        """
+        batch_item = None if extra_context else (speaker, dialogo)
+
+        while True:
+            grant = await self._acquire_slot(texto, batch_item)
+            if grant is True:
+                break
 
-                if use_context:
-                    print(f"[Context] ✅ ON | mini_context={len(self.mini_context)} | send_lines={min(5, len(self.mini_context))}")
-                else:
-                    print(f"[Context] ⛔ OFF | mini_context={len(self.mini_context)}")
-
-                span.set_attribute("context_active", use_context)
-
-                # ======================
-                # API DeepSeek
-                # ======================
-                t_start = time.time()
-                resultado = ""
-                async for chunk in self.deepseek.translate_stream(
-                    text=texto,
-                    context=context_text
-                ):
-                    resultado += chunk
+            try:
+                resultado = await grant
+            except _BatchFallback:
+                # Batch no separable / con error → request individual
+                batch_item = None
+                continue
+
+            span.set_attribute("batch", True)
+            return resultado, False
+
+        try:
+            batch = self._claim_batch() if batch_item is not None else []
+            if batch:
+                return await self._call_batch(
+                    texto, speaker, dialogo, batch, seq, epoch, span
+                )
 
-                t_elapsed = time.time() - t_start
-                span.set_attribute("translation.duration_ms", round(t_elapsed * 1000))
+            return await self._call_api(
+                texto, speaker, dialogo, seq, epoch, span,
+                extra_context=extra_context, render=render
+            )
+        finally:
+            self._release_slot()
 
-                resultado_final = resultado.strip()
+    async def _call_batch(self, texto: str, speaker, dialogo, batch, seq, epoch, span):
+        items = [(speaker, dialogo)] + [item for _, item, _ in batch]
 
-                with self.translation_lock:
-                    self.current_translation["text"] = resultado_final
-                    self.current_translation["id"] += 1
+        use_context = len(self.mini_context) > 0
+        context_text = "\n".join(self.mini_context[-5:]) if use_context else ""
 
-                self.cache.set(texto, resultado_final)
-                self.sqlite_cache.set(texto, resultado_final)
+        print(f"[Batch] 📦 {len(items)} textos en un request (cola={len(self.pending_texts)})")
+        span.set_attribute("batch", True)
+        span.set_attribute("batch.size", len(items))
 
-                translations_total.add(1)
-                print(f"[API] 🌐 NEW ({round(t_elapsed*1000)}ms):\n{texto}\n→\n{resultado_final}\n")
+        t_start = time.time()
+        try:
+            resultados = await self.deepseek.translate_batch(items, context=context_text)
+        except BaseException:
+            self._fail_batch(batch)
+            raise
 
-                # ======================
-                # MINI CONTEXTO (guardar)
-                # ======================
-                if not es_dialogo_trivial(dialogo):
-                    self.mini_context.append(resultado_final)
-                    if len(self.mini_context) > 8:
-                        self.mini_context.pop(0)
+        if resultados is None:
+            print("[Batch] ⚠️ Salida no separable → requests individuales")
+            self._fail_batch(batch)
+            return await self._call_api(texto, speaker, dialogo, seq, epoch, span)
+
+        t_elapsed = time.time() - t_start
+        span.set_attribute("translation.duration_ms", round(t_elapsed * 1000))
 
-            except Exception as e:
-                print(f"[Worker] Error: {e}")
-                span.record_exception(e)
-                with self.translation_lock:
-                    self.current_translation["text"] = f"[Error: {e}]"
-                    self.current_translation["id"] += 1
-                    self.current_translation["context_active"] = False
+        textos = [texto] + [t for t, _, _ in batch]
+        print(f"[API] 🌐 BATCH NEW ({round(t_elapsed*1000)}ms):")
+        for t, r in zip(textos, resultados):
+            print(f"  {t[:60]} → {r[:60]}")
 
-            finally:
-                with self.translation_lock:
-                    self.current_translation["busy"] = False
+        for (_, _, fut), resultado in zip(batch, resultados[1:]):
+            if not fut.done():
+                fut.set_result(resultado.strip())
+
+        return resultados[0].strip(), use_context
+
+    # ==========================
+    # SEGMENTOS (una línea = una entrada de cache)
+    # ==========================
+    def _lookup_exact(self, texto: str, ns):
+        """RAM → SQLite, sin fuzzy ni métricas."""
+        cached = self.cache.get(texto, ns)
+        if cached:
+            self.sqlite_cache.touch(texto, ns)
+            return cached
 
-                queue_size.add(-1) if self.pending_texts else None
+        cached = self.sqlite_cache.get(texto, ns)
+        if cached:
+            self.cache.set(texto, cached, ns)
+        return cached
+
+    def _store_segments(self, segments, resultado: str, ns):
+        """
+        Guarda la traducción de cada línea solo si la salida
+        trae exactamente una línea por segmento (si no, no se puede repartir).
+        """
+        if len(segments) == 1:
+            partes = [resultado]
+        else:
+            partes = [l.strip() for l in resultado.split("\n") if l.strip()]
+            if len(partes) != len(segments):
+                return
 
-                next_text = None
-                with self.translation_lock:
-                    if self.pending_texts:
-                        next_text = self.pending_texts.pop(0)
+        for seg, parte in zip(segments, partes):
+            if es_dialogo_trivial(seg):
+                continue
+            self.cache.set(seg, parte, ns)
+            self.sqlite_cache.set(seg, parte, ns, history=False)
+
+    @staticmethod
+    def _assemble(cached_parts, resultado: str, strict=False):
+        """
+        Rearma el bloque en el orden original.
+        cached_parts: traducción por línea (None = faltante).
+        strict=True → None si la salida no trae una línea por faltante
+        (solo para mostrar parciales se acepta el desorden).
+        """
+        faltantes = sum(1 for p in cached_parts if p is None)
+        partes = [l.strip() for l in resultado.split("\n") if l.strip()]
+
+        if len(partes) != faltantes:
+            if strict:
+                return None
+            # Parcial: todo en la posición del primer faltante
+            partes = [resultado.strip()] + [""] * (faltantes - 1)
+
+        it = iter(partes)
+        salida = [p if p is not None else next(it) for p in cached_parts]
+        return "\n".join(p for p in salida if p)
+
+    async def _resolve_segments(self, texto: str, lineas, ns, seq, epoch, span):
+        cached_parts = [self._lookup_exact(l, ns) for l in lineas]
+        hits = sum(1 for p in cached_parts if p)
+
+        if hits == 0:
+            return None
+
+        span.set_attribute("segments.total", len(lineas))
+        span.set_attribute("segments.cached", hits)
+
+        # ======================
+        # TODAS LAS LÍNEAS EN CACHE
+        # ======================
+        if hits == len(lineas):
+            resultado_final = "\n".join(cached_parts)
+            print(f"[Cache] 🧩 SEGMENT HIT ({hits}/{len(lineas)})")
+            cache_hits.add(1, {"type": "segment"})
+            span.set_attribute("resultado", "cache_segment")
+            self.cache.set(texto, resultado_final, ns)
+            self.sqlite_cache.set(texto, resultado_final, ns)
+            return {"text": resultado_final, "context_active": False}
+
+        # ======================
+        # SOLO LAS FALTANTES → API (las cacheadas como contexto)
+        # ======================
+        cached_parts = [p or None for p in cached_parts]
+        faltantes = [l for l, p in zip(lineas, cached_parts) if p is None]
+        texto_api = "\n".join(faltantes)
+        print(f"[Cache] 🧩 SEGMENT PARCIAL ({hits}/{len(lineas)}) → API {len(faltantes)} línea(s)")
+        cache_hits.add(1, {"type": "segment_partial"})
+
+        speaker, dialogo = self._detect_speaker(texto_api)
+        extra_context = "\n".join(p for p in cached_parts if p)
+
+        resultado, use_context, nuevo = await self._translate(
+            texto_api, speaker, dialogo, ns, seq, epoch, span,
+            extra_context=extra_context,
+            render=lambda parcial: self._assemble(cached_parts, parcial)
+        )
+
+        if nuevo:
+            self._store_segments(faltantes, resultado, ns)
+
+        resultado_final = self._assemble(cached_parts, resultado, strict=True)
+        if resultado_final is None:
+            # No se puede repartir sin desordenar → bloque completo a la API
+            print("[Cache] 🧩 Líneas no coinciden → se traduce el bloque completo")
+            return None
+
+        self.cache.set(texto, resultado_final, ns)
+        self.sqlite_cache.set(texto, resultado_final, ns)
+
+        return {
+            "text": resultado_final,
+            "context_active": use_context,
+            "context_add": resultado_final if nuevo else None,
+        }
 
-                if next_text:
-                    print(f"[Queue] Dequeue → traduciendo: {next_text[:60]}")
-                    asyncio.create_task(self.traducir_texto(next_text))
\ No newline at end of file
+    def _fuzzy_lookup(self, texto: str, ns, span):
+        if self.fuzzy is None:
+            return None
+
+        match = self.fuzzy.lookup(texto, ns)
+        if not match:
+            return None
+
+        key, score = match
+        cached = self.sqlite_cache.get_key(key, ns)
+        if not cached:
+            return None
+
+        print(f"[Cache] 🔍 FUZZY HIT ({score:.2f}): {key[:60]}")
+        cache_hits.add(1, {"type": "fuzzy"})
+        cache_fuzzy_score.record(score)
+        span.set_attribute("resultado", "cache_fuzzy")
+        span.set_attribute("fuzzy.score", round(score, 3))
+        return cached
+
+    async def _call_api(self, texto: str, speaker, dialogo, seq, epoch, span,
+                        extra_context="", render=None):
+        # ======================
+        # CONTEXTO (mini-context)
+        # ======================
+        use_context = len(texto) > 25 and len(self.mini_context) > 0
+        context_text = "\n".join(self.mini_context[-5:]) if use_context else ""
+
+        # Líneas del mismo bloque ya traducidas (cache por segmento):
+        # van siempre, aunque la línea faltante sea corta
+        force_context = bool(extra_context)
+        if force_context:
+            context_text = "\n".join(filter(None, (context_text, extra_context)))
+
+        # Lo que realmente se envía (translate_stream aplica su propio mínimo)
+        use_context = self.deepseek.uses_context(context_text, dialogo, force_context)
+
+        if use_context:
+            print(f"[Context] ✅ ON | mini_context={len(self.mini_context)} | send_lines={min(5, len(self.mini_context))}")
+        else:
+            print(f"[Context] ⛔ OFF | mini_context={len(self.mini_context)}")
+
+        span.set_attribute("context_active", use_context)
+
+        # ======================
+        # API DeepSeek
+        # ======================
+        t_start = time.time()
+        t_first = None
+        resultado = ""
+        async for chunk in self.deepseek.translate_stream(
+            text=texto,
+            context=context_text,
+            speaker=speaker,
+            dialogue=dialogo,
+            force_context=force_context
+        ):
+            resultado += chunk
+            if t_first is None:
+                t_first = time.time() - t_start
+
+            # Parcial → overlay (solo el primero en orden; mismo id mientras crece)
+            with self.translation_lock:
+                if self._is_head(seq, epoch):
+                    self._publish_locked(
+                        render(resultado) if render else resultado.strip(),
+                        partial=True,
+                        same_id=self._partial_seq == seq,
+                        context_active=use_context
+                    )
+                    self._partial_seq = seq
+
+        t_elapsed = time.time() - t_start
+        span.set_attribute("translation.duration_ms", round(t_elapsed * 1000))
+        if t_first is not None:
+            span.set_attribute("translation.first_chunk_ms", round(t_first * 1000))
+
+        resultado_final = resultado.strip()
+        print(f"[API] 🌐 NEW ({round(t_elapsed*1000)}ms):\n{texto}\n→\n{resultado_final}\n")
+
+        return resultado_final, use_context
@@ -39,6 +39,94 @@ def es_dialogo_trivial(dialogo: str) -> bool:
     return False
 
 
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class NameIndex:
+    """
+    Trie de prefijos sobre los nombres conocidos.
+    - Costo de búsqueda = largo del nombre, no cantidad de nombres
+    - Longest match determinista ("Old man" gana sobre "Man"/"Old")
+    """
+
+    _END = ""
+
+    def __init__(self, names=()):
+        self.names = frozenset(names)
+        self._root = {}
+
+        for name in self.names:
+            node = self._root
+            for ch in name:
+                node = node.setdefault(ch, {})
+            node[self._END] = name
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def prefixes(self, text: str):
+        """Nombres que son prefijo de text, del más largo al más corto."""
+        found = []
+        node = self._root
+        for ch in text:
+            node = node.get(ch)
+            if node is None:
+                break
+            if self._END in node:
+                found.append(node[self._END])
+        found.reverse()
+        return found
+
+    def find_all(self, *texts):
+        """
+        Nombres que aparecen en cualquier posición de los textos
+        (multi-patrón: un recorrido del trie por posición de inicio).
+        Nombres latinos solo como palabra completa ("Ana" no matchea "Banana").
+        """
+        found = set()
+        for text in texts:
+            if not text:
+                continue
+
+            n = len(text)
+            for i in range(n):
+                node = self._root.get(text[i])
+                if node is None:
+                    continue
+                if i and _is_word_char(text[i - 1]) and _is_word_char(text[i]):
+                    continue
+
+                j = i
+                while True:
+                    name = node.get(self._END)
+                    if name and not (
+                        j + 1 < n and _is_word_char(text[j]) and _is_word_char(text[j + 1])
+                    ):
+                        found.add(name)
+                    j += 1
+                    if j >= n:
+                        break
+                    node = node.get(text[j])
+                    if node is None:
+                        break
+        return found
+
+    def match_prefix(self, text: str, strip_chars: str):
+        """
+        Primer nombre (longest match) que deja texto después del separador.
+        Retorna (name, resto) o (None, None).
+        """
+        for name in self.prefixes(text):
+            resto = text[len(name):].lstrip(strip_chars)
+            if resto:
+                return name, resto.strip()
+        return None, None
+
+
 def detectar_speaker_inline(texto: str, known_names=None):
     """
     Detecta speaker pegado al inicio del texto.
@@ -47,16 +135,17 @@ def detectar_speaker_inline(texto: str, known_names=None):
     - Alex: Hello
     - Alex, hello
     - Alex… hi
+
+    known_names: NameIndex (recomendado, se construye una vez) o set.
     """
     if not texto or not known_names:
         return None, texto
 
-    t = texto.strip()
+    if not isinstance(known_names, NameIndex):
+        known_names = NameIndex(known_names)
 
-    for name in known_names:
-        if t.startswith(name) and len(t) > len(name):
-            resto = t[len(name):].lstrip(" .,:;!?…")
-            if resto:
-                return name, resto.strip()
+    name, resto = known_names.match_prefix(texto.strip(), " .,:;!?…")
+    if name:
+        return name, resto
 
     return None, texto